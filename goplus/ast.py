@@ -9,6 +9,7 @@ from typing import cast
 from typing import Dict
 from typing import List
 from typing import Union
+from typing import Callable
 from typing import Optional
 from typing import Sequence
 
@@ -126,6 +127,14 @@ class Bool(Value):
     kind = TokenType.Bool
 
 class Name(Value):
+    bind_: Optional[Any]
+
+    # resolved symbol binding, a cache filled by the inferrer, it refers into the
+    # scopes of one inference run, so it is never pickled or copied along with the node
+    __transient__ = {
+        'bind_',
+    }
+
     kind = TokenType.Name
 
 class Rune(Value):
@@ -508,11 +517,23 @@ class TypeSpec(Node):
         return ret
 
 class Function(Node):
-    name: Name
-    opts: FunctionOptions
-    type: FunctionSignature
-    recv: Optional[FunctionArgument]
-    body: Optional['CompoundStatement']
+    name  : Name
+    opts  : FunctionOptions
+    type  : FunctionSignature
+    recv  : Optional[FunctionArgument]
+    body_ : Optional['CompoundStatement']
+    lazy_ : Optional[Callable[[], Optional['CompoundStatement']]]
+
+    @property
+    def body(self) -> Optional['CompoundStatement']:
+        if self.lazy_ is not None:
+            self.body_, self.lazy_ = self.lazy_(), None
+        return self.body_
+
+    @body.setter
+    def body(self, body: Optional['CompoundStatement']):
+        self.body_ = body
+        self.lazy_ = None
 
     def clone(self) -> 'Function':
         ret = cast(Function, super().clone())
@@ -520,7 +541,8 @@ class Function(Node):
         ret.name = self.name.clone()
         ret.type = self.type.clone()
         ret.recv = self.recv and self.recv.clone()
-        ret.body = self.body and self.body.clone()
+        ret.body_ = self.body_ and self.body_.clone()
+        ret.lazy_ = self.lazy_
         return ret
 
 class ImportC(Node):
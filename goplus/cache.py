@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import zlib
+import pickle
+import hashlib
+import tempfile
+
+from typing import Any
+from typing import Set
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Iterable
+from typing import Optional
+
+from collections import OrderedDict
+
+from . import exports
+from .utils import _fields_of
+from .symbol import Scope
+from .symbol import PackageScope
+
+# bump this whenever the AST, the parser or the inferrer changes
+CACHE_VERSION = 1
+
+Context = Tuple[
+    str,
+    ...
+]
+
+PackageKey = Tuple[
+    str,
+    Context,
+]
+
+Stamp = Tuple[
+    Tuple[str, int, int],
+    ...
+]
+
+def _layout() -> str:
+    ret = hashlib.sha256()
+    seen = set()
+    stack = [*exports.SHARED_TYPES, Scope]
+
+    # pickled objects only store the field values, so the cached entries
+    # depend on the fields of every class that could be in them
+    while stack:
+        cls = stack.pop()
+        if cls not in seen:
+            seen.add(cls)
+            stack.extend(cls.__subclasses__())
+
+    # the order of the classes must be stable
+    for name, fields in sorted(('%s.%s' % (cls.__module__, cls.__qualname__), _fields_of(cls)) for cls in seen):
+        ret.update(('%s:%s\0' % (name, ','.join(fields))).encode('utf-8'))
+
+    # all done
+    return ret.hexdigest()
+
+# changes to the class layouts invalidate all the cached entries
+CACHE_LAYOUT = _layout()
+
+class FileCache:
+    root   : str
+    size   : int
+    limit  : int
+    files  : Dict[str, int]
+    suffix : str
+
+    def __init__(self, root: str, limit: int = 256 * 1024 * 1024):
+        self.root = root
+        self.size = 0
+        self.limit = limit
+        self.files = {}
+        self._scan()
+
+    def _scan(self):
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root, exist_ok = True)
+
+        # find out all the existing entries, the least recently used goes first
+        for st, fname in sorted(((ent.stat(), ent.path) for ent in self._entries()), key = lambda v: v[0].st_mtime):
+            self.size += st.st_size
+            self.files[fname] = st.st_size
+
+    def _entries(self) -> Iterable[os.DirEntry]:
+        for sub in os.scandir(self.root):
+            if sub.is_dir():
+                for ent in os.scandir(sub.path):
+                    if ent.is_file() and ent.name.endswith(self.suffix):
+                        yield ent
+
+    def spec(self) -> Tuple[Any, ...]:
+        return type(self), self.root, self.limit
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + self.suffix)
+
+    def _hash(self, *vals: str) -> Any:
+        ret = hashlib.sha256()
+        ver = sys.version_info
+
+        # the pickle format depends on the Python version and the class layouts
+        ret.update(('%d:%d.%d:%s\0' % (CACHE_VERSION, ver[0], ver[1], CACHE_LAYOUT)).encode('utf-8'))
+        ret.update('\0'.join(vals).encode('utf-8'))
+        return ret
+
+    def _evict(self):
+        while self.size > self.limit and self.files:
+            fname = next(iter(self.files))
+            self.size -= self.files.pop(fname)
+            self._discard(fname)
+
+    def _discard(self, fname: str):
+        try:
+            os.unlink(fname)
+        except FileNotFoundError:
+            pass
+
+    def _read(self, key: str) -> Optional[bytes]:
+        fname = self._path(key)
+        size = self.files.pop(fname, None)
+
+        # not cached
+        if size is None:
+            return None
+
+        # read the entry, treat broken ones as missing
+        try:
+            with open(fname, 'rb') as fp:
+                ret = zlib.decompress(fp.read())
+        except (OSError, zlib.error):
+            self.size -= size
+            return None
+
+        # mark as the most recently used one
+        os.utime(fname)
+        self.files[fname] = size
+        return ret
+
+    def _write(self, key: str, data: bytes):
+        fname = self._path(key)
+        fpath = os.path.dirname(fname)
+        data = zlib.compress(data, 1)
+
+        # create the sub-directory if needed
+        if not os.path.isdir(fpath):
+            os.makedirs(fpath, exist_ok = True)
+
+        # write to a temporary file, then move it in place,
+        # so readers never see a partially written entry
+        fd, temp = tempfile.mkstemp(dir = fpath)
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data)
+
+        # replace the old one, if any
+        os.replace(temp, fname)
+        self.size += len(data) - self.files.pop(fname, 0)
+        self.files[fname] = len(data)
+        self._evict()
+
+class AstCache(FileCache):
+    suffix = '.ast'
+
+    def key(self, fname: str, src: str, skip: bool, header: bool) -> str:
+        ret = self._hash('%d:%d' % (skip, header), fname)
+        ret.update(src.encode('utf-8'))
+        return ret.hexdigest()
+
+    def load(self, key: str) -> Optional[Any]:
+        data = self._read(key)
+
+        # not cached
+        if data is None:
+            return None
+
+        # broken or outdated entries are treated as missing
+        try:
+            return pickle.loads(data)
+        except Exception:
+            return None
+
+    def save(self, key: str, val: Any):
+        self._write(key, pickle.dumps(val, pickle.HIGHEST_PROTOCOL))
+
+class MemoryAstCache(AstCache):
+    blobs: Dict[str, bytes]
+
+    def __init__(self, limit: int = 64 * 1024 * 1024):
+        self.blobs = {}
+        super().__init__('<memory>', limit)
+
+    def spec(self) -> Tuple[Any, ...]:
+        return type(self), self.limit
+
+    def _scan(self):
+        pass
+
+    def _discard(self, fname: str):
+        del self.blobs[fname]
+
+    def _read(self, key: str) -> Optional[bytes]:
+        size = self.files.pop(key, None)
+
+        # not cached
+        if size is None:
+            return None
+
+        # mark as the most recently used one
+        self.files[key] = size
+        return self.blobs[key]
+
+    def _write(self, key: str, data: bytes):
+        self.blobs[key] = data
+        self.size += len(data) - self.files.pop(key, 0)
+        self.files[key] = len(data)
+        self._evict()
+
+class ExportCache(FileCache):
+    suffix = '.exp'
+
+    def key(self, ctx: List[str], path: str, files: List[Tuple[str, str]], deps: List[str]) -> str:
+        ret = self._hash(path, *ctx)
+
+        # hashes of every source file
+        for fname, src in files:
+            ret.update(fname.encode('utf-8') + b'\0')
+            ret.update(hashlib.sha256(src.encode('utf-8')).digest())
+
+        # export data hashes of the dependencies, changes of the
+        # dependencies are propagated through them
+        for dep in deps:
+            ret.update(dep.encode('utf-8') + b'\0')
+
+        # all done
+        return ret.hexdigest()
+
+    def load(self, key: str, refs: List[Any]) -> Optional[Any]:
+        data = self._read(key)
+
+        # not cached
+        if data is None:
+            return None
+
+        # broken or outdated entries are treated as missing
+        try:
+            return exports.loads(data, refs)
+        except Exception:
+            return None
+
+    def save(self, key: str, val: Any, refs: List[Any]):
+        self._write(key, exports.dumps(val, refs))
+
+def _stamp(fpath: str) -> Stamp:
+    ret = []
+
+    # the directory might be removed
+    try:
+        ents = list(os.scandir(fpath))
+    except OSError:
+        return ()
+
+    # modification time and size of every source file
+    for ent in ents:
+        if ent.name.endswith('.go'):
+            try:
+                st = ent.stat()
+            except OSError:
+                continue
+            else:
+                ret.append((ent.name, st.st_mtime_ns, st.st_size))
+
+    # all done
+    return tuple(sorted(ret))
+
+class PackageEntry:
+    pkg   : PackageScope
+    size  : int
+    deps  : List[PackageScope]
+    stamp : Stamp
+
+    def __init__(self, pkg: PackageScope, size: int, deps: List[PackageScope], stamp: Stamp):
+        self.pkg = pkg
+        self.size = size
+        self.deps = deps
+        self.stamp = stamp
+
+class PackageCache:
+    size   : int
+    limit  : int
+    items  : Dict[PackageKey, PackageEntry]
+    owners : Dict[int, PackageKey]
+    stamps : Dict[str, Stamp]
+    fresh  : Set[PackageKey]
+
+    def __init__(self, limit: int = 64 * 1024 * 1024):
+        self.size = 0
+        self.limit = limit
+        self.items = OrderedDict()
+        self.owners = {}
+        self.stamps = {}
+        self.fresh = set()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _remove(self, key: PackageKey):
+        ent = self.items.pop(key)
+        self.size -= ent.size
+        self.fresh.discard(key)
+        self.owners.pop(id(ent.pkg), None)
+
+    def _stamp(self, fpath: str) -> Stamp:
+        if fpath in self.stamps:
+            return self.stamps[fpath]
+        else:
+            ret = self.stamps[fpath] = _stamp(fpath)
+            return ret
+
+    def _verify(self, key: PackageKey) -> bool:
+        keys = [key]
+        seen = set()
+
+        # check this package and all of its dependencies, stop at the ones that
+        # are already checked, changes of dependencies are only seen in this way
+        while keys:
+            dep = keys.pop()
+            ent = dep and self.items.get(dep)
+
+            # dependencies that have been evicted cannot be checked anymore
+            if ent is None:
+                break
+
+            # already checked
+            if dep in self.fresh or dep in seen:
+                continue
+
+            # drop the changed packages, along with everything that depends on them
+            if self._stamp(dep[0]) != ent.stamp:
+                self.invalidate(dep[0])
+                break
+
+            # check the dependencies as well
+            seen.add(dep)
+            keys.extend(self.owners.get(id(pkg)) for pkg in ent.deps)
+
+        # everything is up to date
+        else:
+            self.fresh.update(seen)
+            return True
+
+        # drop this one as well, in case it is not reachable by the invalidation
+        if key in self.items:
+            self._remove(key)
+
+        # all done
+        return False
+
+    def refresh(self):
+        self.fresh.clear()
+        self.stamps.clear()
+
+    def get(self, fpath: str, ctx: Context) -> Optional[PackageScope]:
+        key = (fpath, ctx)
+        ret = self.items.get(key)
+
+        # not cached, or the sources have been changed
+        if ret is None or not self._verify(key):
+            return None
+
+        # mark as the most recently used one
+        self.items.move_to_end(key)
+        return ret.pkg
+
+    def put(self, fpath: str, ctx: Context, pkg: PackageScope, size: int, deps: List[PackageScope]):
+        key = (fpath, ctx)
+
+        # replace the old one, if any
+        if key in self.items:
+            self._remove(key)
+
+        # the size of the sources is used as an approximation of memory usage
+        self.size += size
+        self.owners[id(pkg)] = key
+        self.items[key] = PackageEntry(pkg, size, deps, self._stamp(fpath))
+
+        # evict the least recently used ones, but keep the newest one anyway
+        while self.size > self.limit and len(self.items) > 1:
+            self._remove(next(iter(self.items)))
+
+    def invalidate(self, fpath: Optional[str] = None):
+        if fpath is None:
+            self.size = 0
+            self.fresh.clear()
+            self.items.clear()
+            self.owners.clear()
+            return
+
+        # find the packages in this directory, in every build context
+        keys = [key for key in self.items if key[0] == fpath]
+        drop = set(id(self.items[key].pkg) for key in keys)
+
+        # packages that depend on them must be inferred again as well
+        while keys:
+            for key in keys:
+                self._remove(key)
+
+            # find the packages that depend on the removed ones
+            keys = [key for key, val in self.items.items() if any(id(dep) in drop for dep in val.deps)]
+            drop.update(id(self.items[key].pkg) for key in keys)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+import io
+import pickle
+
+from typing import Any
+from typing import Set
+from typing import Dict
+from typing import List
+
+from .ast import Node
+from .types import Type
+from .types import Types
+from .types import Method
+from .types import TypeTable
+from .types import StructField
+
+from .symbol import Symbol
+from .symbol import BUILTIN_SYMBOLS
+
+SHARED_TYPES = (
+    Node,
+    Type,
+    Method,
+    Symbol,
+    StructField,
+)
+
+class Pickler(pickle.Pickler):
+    refs: dict
+
+    def __init__(self, fp: io.BytesIO, refs: List[Any]):
+        self.refs = {id(val): idx for idx, val in enumerate(refs)}
+        super().__init__(fp, pickle.HIGHEST_PROTOCOL)
+
+    def persistent_id(self, obj: Any) -> Any:
+        return self.refs.get(id(obj))
+
+class Unpickler(pickle.Unpickler):
+    refs: List[Any]
+
+    def __init__(self, fp: io.BytesIO, refs: List[Any]):
+        self.refs = refs
+        super().__init__(fp)
+
+    def persistent_load(self, pid: Any) -> Any:
+        return self.refs[pid]
+
+def _collect(val: Any, refs: List[Any], seen: Set[int]):
+    stack = [val]
+
+    # iterative pre-order traversal, type graphs can be very deep
+    while stack:
+        val = stack.pop()
+
+        # containers are copied as-is, only the objects within are shared
+        if isinstance(val, (list, tuple)):
+            stack.extend(reversed(val))
+        elif isinstance(val, dict):
+            stack.extend(reversed(list(val.values())))
+        elif isinstance(val, SHARED_TYPES) and id(val) not in seen:
+            seen.add(id(val))
+            refs.append(val)
+            stack.extend(reversed(val.__getstate__()))
+
+def _remap(val: Any, objs: Dict[int, Any]) -> Any:
+    if isinstance(val, list):
+        val[:] = [_remap(v, objs) for v in val]
+        return val
+    elif isinstance(val, tuple):
+        ret = tuple(_remap(v, objs) for v in val)
+        return val if all(a is b for a, b in zip(val, ret)) else ret
+    elif isinstance(val, dict):
+        val.update({k: _remap(v, objs) for k, v in val.items()})
+        return val
+    else:
+        return objs.get(id(val), val)
+
+def _postorder(val: Any, seen: Set[int]) -> List[Any]:
+    ret = []
+    stack = [(val, False)]
+
+    # iterative post-order traversal, so components always go before the types using them
+    while stack:
+        val, done = stack.pop()
+
+        # all the fields of this object have been visited
+        if done:
+            ret.append(val)
+            continue
+
+        # containers are traversed just like `_collect`
+        if isinstance(val, (list, tuple)):
+            stack.extend((v, False) for v in reversed(val))
+        elif isinstance(val, dict):
+            stack.extend((v, False) for v in reversed(list(val.values())))
+        elif isinstance(val, SHARED_TYPES) and id(val) not in seen:
+            seen.add(id(val))
+            stack.append((val, True))
+            stack.extend((v, False) for v in reversed(val.__getstate__()))
+
+    # all done
+    return ret
+
+def _builtins() -> List[Any]:
+    ret = []
+    _collect([v for v in vars(Types).values() if isinstance(v, Type)], ret, set())
+    _collect(BUILTIN_SYMBOLS, ret, {id(v) for v in ret})
+    return ret
+
+# objects that must keep their identities across processes
+BUILTINS = _builtins()
+
+def references(val: Any) -> List[Any]:
+    ret = BUILTINS[:]
+    _collect(val, ret, {id(v) for v in ret})
+    return ret
+
+def dumps(val: Any, refs: List[Any]) -> bytes:
+    buf = io.BytesIO()
+    Pickler(buf, refs).dump(val)
+    return buf.getvalue()
+
+def loads(data: bytes, refs: List[Any]) -> Any:
+    return Unpickler(io.BytesIO(data), refs).load()
+
+def intern(val: Any, refs: List[Any], types: TypeTable) -> Any:
+    """
+    Replaces the composite types within the loaded objects with the canonical
+    instances from the type table. References are left as-is, since they are
+    either canonical already or owned by other packages.
+    """
+    objs = {}
+    seen = {id(v) for v in refs}
+
+    # components are replaced before the types that contain them,
+    # so the intern keys of the containing types are canonical as well
+    for obj in _postorder(val, seen):
+        state = obj.__getstate__()
+        remap = tuple(_remap(v, objs) for v in state)
+
+        # only update the objects that have changed
+        if any(a is not b for a, b in zip(state, remap)):
+            obj.__setstate__(remap)
+
+        # find the canonical type, if any
+        if isinstance(obj, Type):
+            ret = types.intern(obj)
+            if ret is not obj:
+                objs[id(obj)] = ret
+
+    # all done
+    return _remap(val, objs)
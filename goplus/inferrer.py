@@ -2,10 +2,17 @@
 
 import os
 import enum
+import stat
 import math
 import operator
 import functools
 
+from concurrent.futures import wait
+from concurrent.futures import Future
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+
+from typing import Any
 from typing import Set
 from typing import cast
 from typing import Dict
@@ -69,7 +76,9 @@ from .ast import InterfaceMethod as InterfaceMethodNode
 from .types import Kind
 from .types import Type
 from .types import Types
+from .types import TypeTable
 from .types import Method
+from .types import MethodStamp
 
 from .types import MapType
 from .types import PtrType
@@ -103,6 +112,14 @@ from .tokenizer import TokenValue
 from .parser import Parser
 from .tokenizer import Tokenizer
 
+from . import exports
+from .cache import Context
+from .cache import AstCache
+from .cache import FileCache
+from .cache import ExportCache
+from .cache import MemoryAstCache
+from .cache import PackageCache
+
 GOOS = {
     'aix',
     'android',
@@ -365,6 +382,41 @@ def _is_f32(v: float) -> bool:
 def _is_f64(v: float) -> bool:
     return -1.7976931348623158e+308 <= v <= 1.7976931348623158e+308
 
+def _parse_source(path: str, source: str, skip: bool, header: bool) -> Package:
+    parser = Parser(Tokenizer(source, path), skip_bodies = skip)
+    return parser.parse_header() if header else parser.parse()
+
+# worker processes keep their inferrer and caches between jobs
+_remote_caches = {}
+_remote_inferrer = None
+
+def _remote_cache(spec: Optional[Tuple[Any, ...]]) -> Optional[FileCache]:
+    if spec is None:
+        return None
+    elif spec in _remote_caches:
+        return _remote_caches[spec]
+    else:
+        cls, *args = spec
+        ret = _remote_caches[spec] = cls(*args)
+        return ret
+
+def _infer_remote(conf: 'RemoteConfig', name: str, data: bytes, loc: 'Location') -> bytes:
+    global _remote_inferrer
+    deps = exports.loads(data, exports.BUILTINS)
+    refs = exports.references(deps)
+
+    # create the inferrer only when the configuration changes
+    if _remote_inferrer is not None and _remote_inferrer[0] == conf:
+        ifr = _remote_inferrer[1]
+    else:
+        ifr = Inferrer._from_remote(conf)
+        _remote_inferrer = (conf, ifr)
+
+    # symbols from the dependencies are sent back as references,
+    # so the importers still share the same objects with each other
+    pkg = ifr._infer_package(False, ifr._string(name), [], deps, loc[2], {name: loc})
+    return exports.dumps(pkg.exports(), refs)
+
 LITERAL_RANGES = {
     Kind.Bool       : lambda v: False,
     Kind.Int        : lambda v: -0x8000000000000000 <= v <= 0x7fffffffffffffff,
@@ -428,7 +480,49 @@ CONSTRUCTING_MAPS = {
 
 PackageMap = Dict[
     str,
-    Package,
+    'Declaration',
+]
+
+DeclarationSpec = Union[
+    InitSpec,
+    TypeSpec,
+    Function,
+]
+
+ImportGraph = Dict[
+    str,
+    List[str],
+]
+
+Location = Tuple[
+    str,
+    str,
+    Optional[Module],
+]
+
+LocationMap = Dict[
+    str,
+    Location,
+]
+
+Relation = Tuple[
+    Type,
+    Type,
+    MethodStamp,
+    bool,
+]
+
+Target = Tuple[
+    str,
+    str,
+    Set[str],
+]
+
+Signature = Tuple[
+    bool,
+    str,
+    Tuple[str, ...],
+    Tuple[int, ...],
 ]
 
 NumericType = Union[
@@ -442,6 +536,28 @@ FunctionType = Union[
     InterfaceMethodNode,
 ]
 
+Predicate = Callable[
+    [Set[str]],
+    bool,
+]
+
+FileHeader = Tuple[
+    int,
+    int,
+    Predicate,
+]
+
+ModuleFile = Tuple[
+    int,
+    int,
+    Module,
+]
+
+RemoteConfig = Tuple[
+    Any,
+    ...
+]
+
 class Mode(enum.IntEnum):
     GO_MOD    = 0
     GO_VENDOR = 1
@@ -493,6 +609,10 @@ class Tag:
     def eval(self, tagv: Set[str]) -> bool:
         return self.invert is (self.name not in tagv)
 
+    def compile(self) -> Predicate:
+        name = self.name
+        return (lambda v: name not in v) if self.invert else (lambda v: name in v)
+
 class Tags:
     comb: bool
     tags: List[Union[Tag, 'Tags']]
@@ -512,16 +632,40 @@ class Tags:
             return '(%s)' % ' AND '.join(map(repr, self.tags))
 
     def eval(self, tagv: Set[str]) -> bool:
-        ret = self.comb
+        for tag in self.tags:
+            if tag.eval(tagv) != self.comb:
+                return not self.comb
+        else:
+            return self.comb
+
+    def compile(self) -> Predicate:
+        comb = self.comb
         tags = self.tags
 
-        # combine every tag
-        while tags and ret == self.comb:
-            ret = tags[0].eval(tagv)
-            tags = tags[1:]
+        # no tags at all, the result is a constant
+        if not tags:
+            return lambda _: comb
 
-        # all done
-        return ret
+        # simple tags can be tested against the tag set as a whole
+        if all(isinstance(v, Tag) for v in tags):
+            pos = frozenset(v.name for v in tags if not v.invert)
+            neg = frozenset(v.name for v in tags if v.invert)
+
+            # AND requires every tag, OR requires any of them
+            if comb:
+                return lambda v: pos <= v and neg.isdisjoint(v)
+            else:
+                return lambda v: not pos.isdisjoint(v) or not neg <= v
+
+        # compile every sub-expression
+        funcs = [v.compile() for v in tags]
+        check = all if comb else any
+
+        # combine the results
+        if len(funcs) == 1:
+            return funcs[0]
+        else:
+            return lambda v: check(f(v) for f in funcs)
 
 class Trace:
     path  : str
@@ -538,6 +682,16 @@ class Trace:
         self.trace.append(self.path)
         return self
 
+class Declaration:
+    file  : Package
+    spec  : DeclarationSpec
+    index : int
+
+    def __init__(self, file: Package, spec: DeclarationSpec, index: int):
+        self.file = file
+        self.spec = spec
+        self.index = index
+
 class NameGen:
     index  : int
     prefix : str
@@ -563,6 +717,33 @@ class InplaceGen(NameGen):
     index = -1
     prefix = '$_inplace_'
 
+def relation(func: Callable[['Inferrer', Type, Type], bool]) -> Callable[['Inferrer', Type, Type], bool]:
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self: 'Inferrer', t1: Type, t2: Type) -> bool:
+        key = (name, id(t1), id(t2))
+        ret = self.rels.get(key)
+
+        # verdicts are valid until any of the involved types gets a new method
+        if ret is not None and ret[2].valid():
+            self.hits += 1
+            return ret[3]
+
+        # not checked before
+        self.misses += 1
+        stamp = MethodStamp(t1, t2)
+        val = func(self, t1, t2)
+
+        # incomplete types might change later, the types are kept in
+        # the cache, so the IDs won't be reused by other objects
+        if t1.valid and t2.valid:
+            self.rels[key] = (t1, t2, stamp, val)
+
+        # all done
+        return val
+    return wrapper
+
 class Inferrer:
     os      : str
     arch    : str
@@ -571,6 +752,17 @@ class Inferrer:
     test    : bool
     mode    : Mode
     iota    : Optional[int]
+    asts    : Optional[AstCache]
+    exps    : Optional[ExportCache]
+    pkgs    : Optional[PackageCache]
+    hdrs    : Dict[str, FileHeader]
+    gomods  : Dict[str, ModuleFile]
+    rels    : Dict[Tuple[str, int, int], Relation]
+    hits    : int
+    misses  : int
+    types   : TypeTable
+    jobs    : int
+    pool    : Optional[ProcessPoolExecutor]
     tags    : Set[str]
     paths   : List[str]
     backend : Backend
@@ -608,15 +800,72 @@ class Inferrer:
         self.test    = False
         self.mode    = Mode.GO_MOD
         self.iota    = None
+        self.asts    = None
+        self.exps    = None
+        self.pkgs    = PackageCache()
+        self.hdrs    = {}
+        self.gomods  = {}
+        self.rels    = {}
+        self.hits    = 0
+        self.misses  = 0
+        self.types   = TypeTable()
+        self.jobs    = 1
+        self.pool    = None
         self.tags    = set()
         self.paths   = paths
         self.backend = Backend.GC
 
+    @classmethod
+    def _from_remote(cls, conf: RemoteConfig) -> 'Inferrer':
+        osn, arch, proj, root, paths, test, mode, tags, backend, asts, exps = conf
+        ret = cls(osn, arch, proj, root, list(paths))
+
+        # packages are cached by the main process
+        ret.test    = test
+        ret.mode    = mode
+        ret.asts    = _remote_cache(asts)
+        ret.exps    = _remote_cache(exps)
+        ret.pkgs    = None
+        ret.tags    = set(tags)
+        ret.backend = backend
+        return ret
+
+    def _remote_config(self) -> RemoteConfig:
+        return (
+            self.os,
+            self.arch,
+            self.proj,
+            self.root,
+            tuple(self.paths),
+            self.test,
+            self.mode,
+            tuple(sorted(self.tags)),
+            self.backend,
+            None if self.asts is None else self.asts.spec(),
+            None if self.exps is None else self.exps.spec(),
+        )
+
     ### Helper Functions ###
 
     def _error(self, node: Node, msg: str) -> SyntaxError:
         return SyntaxError('%s:%d:%d: %s' % (node.file, node.row + 1, node.col + 1, msg))
 
+    def _context(self) -> Context:
+        return (
+            self.os,
+            self.arch,
+            self.backend.value,
+            str(int(self.test)),
+            *sorted(self.tags),
+        )
+
+    def _refresh(self):
+        if self.pkgs is not None:
+            self.pkgs.refresh()
+
+        # the relation verdicts keep every compared type alive, so they only last for one run
+        self.rels.clear()
+
     def _string(self, val: str) -> String:
         return String(Token(
             0,
@@ -628,34 +877,34 @@ class Inferrer:
 
     ### Symbol Mapping ###
 
-    def _map_name(self, pkg: Package, fmap: PackageMap, name: str, node: Name):
+    def _map_name(self, pkg: Package, fmap: PackageMap, name: str, node: Name, spec: DeclarationSpec, index: int = 0):
         if name != '_':
             if name not in fmap:
-                fmap[name] = pkg
+                fmap[name] = Declaration(pkg, spec, index)
             else:
                 raise self._error(node, '%s redeclared in this package' % repr(name))
 
     def _map_spec_cv(self, pkg: Package, fmap: PackageMap, spec: List[InitSpec]):
         for item in spec:
-            for name in item.names:
+            for idx, name in enumerate(item.names):
                 if name.value != 'init':
-                    self._map_name(pkg, fmap, name.value, name)
+                    self._map_name(pkg, fmap, name.value, name, item, idx)
                 else:
                     raise self._error(name, 'cannot declare init - must be func')
 
     def _map_spec_tp(self, pkg: Package, fmap: PackageMap, spec: List[TypeSpec]):
         for item in spec:
             if item.name.value != 'init':
-                self._map_name(pkg, fmap, item.name.value, item.name)
+                self._map_name(pkg, fmap, item.name.value, item.name, item)
             else:
                 raise self._error(item.name, 'cannot declare init - must be func')
 
     def _map_spec_fn(self, pkg: Package, fmap: PackageMap, spec: List[Function]):
         for item in spec:
             if item.recv is not None:
-                self._map_name(pkg, fmap, self._make_method_name(item), item.name)
+                self._map_name(pkg, fmap, self._make_method_name(item), item.name, item)
             elif item.name.value != 'init':
-                self._map_name(pkg, fmap, item.name.value, item.name)
+                self._map_name(pkg, fmap, item.name.value, item.name, item)
 
     def _make_type_name(self, vtype: TypeNode) -> str:
         if isinstance(vtype, NamedTypeNode):
@@ -678,9 +927,24 @@ class Inferrer:
 
     ### Symbol Management ###
 
+    def _lookup(self, scope: Scope, name: Name) -> Optional[Symbol]:
+        bind = name.bind_
+
+        # each name is resolved only once, then the binding is cached on the node,
+        # names that are not resolved yet might be declared later, so don't cache them
+        if bind is None:
+            bind = scope.bind(name.value)
+            name.bind_ = bind
+
+        # load the symbol from the binding
+        if bind is None:
+            return None
+        else:
+            return scope.load(bind)
+
     def _resolve(self, scope: Scope, pkg: Name, name: Name) -> Symbol:
         key = pkg.value
-        scope = scope.resolve(key)
+        scope = self._lookup(scope, pkg)
 
         # must be a package
         if not isinstance(scope, PackageScope):
@@ -740,8 +1004,8 @@ class Inferrer:
             ln = ln[2:]
             ln = ln.strip()
 
-            # check for build tags
-            if ln.startswith('+build '):
+            # check for build tags, a bare "+build" never matches
+            if ln == '+build' or ln.startswith('+build '):
                 cache.append(ln)
 
         # read the remaining content
@@ -753,13 +1017,33 @@ class Inferrer:
         ret.tags.extend(self._parse_tag(tag) for tag in line.split()[1:])
         return ret
 
-    def _parse_package(self, pkg: str, main: bool) -> Iterable[Package]:
-        for name in os.listdir(pkg):
-            path = os.path.join(pkg, name)
-            base, ext = os.path.splitext(name)
+    def _build_tags(self) -> Set[str]:
+        ret = self.tags
+        ret = ret.copy()
+
+        # add default tags
+        ret.update(GO_VERS)
+        ret.update(GO_EXTRA.get(self.os, []))
+        ret.update([self.os, self.arch, self.backend.value])
+
+        # add "cgo" tag if enabled
+        if '%s/%s' % (self.os, self.arch) in CGO_ENABLED:
+            ret.add('cgo')
+
+        # all done
+        return ret
+
+    def _select_files(self, pkg: str) -> Iterable[Tuple[str, str]]:
+        tagv = self._build_tags()
+        ents = sorted(os.scandir(pkg), key = lambda v: v.name)
+
+        # check every file in the package
+        for ent in ents:
+            path = ent.path
+            base, ext = os.path.splitext(ent.name)
 
             # file names that begin with "." or "_" are ignored
-            if ext != '.go' or base[:1] in ('.', '_') or not os.path.isfile(path):
+            if ext != '.go' or base[:1] in ('.', '_') or not ent.is_file():
                 continue
 
             # check for special suffix
@@ -791,35 +1075,82 @@ class Inferrer:
             if osn and osn != self.os or arch and arch != self.arch:
                 continue
 
-            # parse the package
+            # the build tags are cached until the file changes
+            st = ent.stat()
+            hdr = self.hdrs.get(path)
+
+            # files that are known to be excluded are never opened again
+            if hdr is not None and hdr[:2] == (st.st_mtime_ns, st.st_size):
+                if hdr[2](tagv):
+                    with open(path, newline = None) as fp:
+                        yield path, fp.read()
+                continue
+
+            # parse the build tags
             with open(path, newline = None) as fp:
                 tags, source = self._parse_tags(fp)
 
-            # make a copy of tags
-            tagv = self.tags
-            tagv = tagv.copy()
+            # compile the tags, then eval
+            func = tags.compile()
+            self.hdrs[path] = (st.st_mtime_ns, st.st_size, func)
 
-            # add default tags
-            tagv.update(GO_VERS)
-            tagv.update(GO_EXTRA.get(self.os, []))
-            tagv.update([self.os, self.arch, self.backend.value])
+            # check for build tags
+            if func(tagv):
+                yield path, source
 
-            # add "cgo" tag if enabled
-            if '%s/%s' % (self.os, self.arch) in CGO_ENABLED:
-                tagv.add('cgo')
+    def _parse_package(self, pkg: str, main: bool, header: bool = False) -> Iterable[Package]:
+        return self._parse_files(list(self._select_files(pkg)), main, header)
 
-            # eval tags
-            if not tags.eval(tagv):
-                continue
+    def _parse_files(self, files: List[Tuple[str, str]], main: bool, header: bool = False) -> Iterable[Package]:
+        skip = not main
+        keys = None
+        rets = [None] * len(files)
 
-            # parse the file
-            parser = Parser(Tokenizer(source, path))
-            package = parser.parse()
+        # reuse the cached ASTs, if any
+        if self.asts is not None:
+            keys = [self.asts.key(path, source, skip, header) for path, source in files]
+            rets = [self.asts.load(key) for key in keys]
 
-            # selective package filter
+        # files that still need parsing
+        todo = [i for i, ret in enumerate(rets) if ret is None]
+        srcs = [files[i] for i in todo]
+
+        # headers are cheap enough to parse locally, so does a single file
+        if header or self.jobs <= 1 or len(srcs) <= 1:
+            vals = [_parse_source(path, source, skip, header) for path, source in srcs]
+        else:
+            vals = self._parse_parallel(srcs, skip)
+
+        # save the newly parsed ASTs
+        for i, val in zip(todo, vals):
+            rets[i] = val
+
+            # only when the cache is enabled
+            if keys is not None:
+                self.asts.save(keys[i], val)
+
+        # selective package filter
+        for package in rets:
             if main or package.name.value != 'main':
                 yield package
 
+    def _parse_parallel(self, files: List[Tuple[str, str]], skip: bool) -> List[Package]:
+        jobs = [None] * len(files)
+        order = sorted(range(len(files)), key = lambda i: len(files[i][1]), reverse = True)
+
+        # create the process pool on first use
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.jobs)
+
+        # largest files go first, so they won't be the last to finish,
+        # skipped function bodies are sent back as slices of the token arrays
+        for i in order:
+            path, source = files[i]
+            jobs[i] = self.pool.submit(_parse_source, path, source, skip, False)
+
+        # collect the results in the directory order
+        return [job.result() for job in jobs]
+
     ### Type Converters ###
 
     def _type_of(self, val: Constant) -> Type:
@@ -1006,7 +1337,7 @@ class Inferrer:
         if not self._is_addressable(node):
             raise self._error(node, 'value is not addressable')
         else:
-            return PtrType(vt)
+            return self.types.intern(PtrType(vt))
 
     def _fold_unary_plus(self, node: Node, vt: Type) -> Type:
         if vt.kind not in NUMERIC_KINDS:
@@ -1128,13 +1459,6 @@ class Inferrer:
         else:
             return self._to_const(val.left.val)
 
-    def _find_val(self, syms: List[Symbol], name: Name) -> Symbol:
-        for sym in syms:
-            if sym.name == name.value:
-                return sym
-        else:
-            raise SystemError('invalid symbol table')
-
     def _wrap_prim(self, val: Primary) -> Expression:
         ret = Expression(Token(val.col, val.row, val.file, TokenType.End, None))
         ret.vt = val.vt
@@ -1180,32 +1504,24 @@ class Inferrer:
 
     def _reduce_name(self, ctx: Context, name: Name) -> Operand:
         key = name.value
-        sym = ctx.scope.resolve(key)
+        sym = self._lookup(ctx.scope, name)
 
         # not resolved, maybe defined in another file
         if sym is None and key in ctx.fmap:
-            file = ctx.fmap[key]
-            rctx = self.Context(ctx.pkg, ctx.fmap, file)
+            decl = ctx.fmap[key]
+            spec = decl.spec
+            rctx = self.Context(ctx.pkg, ctx.fmap, decl.file)
+
+            # constants and variables, symbols are in the same order as the names
+            if isinstance(spec, InitSpec):
+                if spec.consts:
+                    sym = self._infer_const_spec(rctx, spec)[decl.index]
+                else:
+                    sym = self._infer_var_spec(rctx, spec)[decl.index]
 
-            # try constant names
-            for spec in file.consts:
-                if any(item.value == name.value for item in spec.names):
-                    sym = self._find_val(self._infer_const_spec(rctx, spec), name)
-                    break
-
-            # still not resolved, try variable names
-            if sym is None:
-                for spec in file.vars:
-                    if any(item.value == name.value for item in spec.names):
-                        sym = self._find_val(self._infer_var_spec(rctx, spec), name)
-                        break
-
-            # still not resolved, try function names
-            if sym is None:
-                for spec in file.funcs:
-                    if spec.name.value == name.value:
-                        sym = self._infer_func_spec(rctx, spec)
-                        break
+            # function names
+            elif isinstance(spec, Function):
+                sym = self._infer_func_spec(rctx, spec)
 
         # still not resolved, try iota if possible
         if sym is None:
@@ -1326,7 +1642,7 @@ class Inferrer:
         if isinstance(val, Name):
             name = val.value
             scope = ctx.scope
-            symbol = scope.resolve(name)
+            symbol = self._lookup(scope, val)
 
             # might be a package name, in which case the first modifier must be a selector
             if isinstance(symbol, PackageScope):
@@ -1605,7 +1921,7 @@ class Inferrer:
             elif vcap and vcap > nb:
                 raise self._error(cap or mod, 'array slicing index %d out of range' % vcap)
             else:
-                return SliceType(at.elem), None
+                return self.types.intern(SliceType(at.elem)), None
 
         # in the case of a string slicing
         elif rt.kind == Kind.String:
@@ -1868,7 +2184,7 @@ class Inferrer:
 
         # resolve the symbol
         if package is None:
-            symbol = ctx.scope.resolve(name.value)
+            symbol = self._lookup(ctx.scope, name)
         else:
             symbol = self._resolve(ctx.scope, package, name)
 
@@ -1912,9 +2228,10 @@ class Inferrer:
             at = cast(ArrayType, rt)
             nb = len(comp.value.items)
 
-            # update with actual size if needed
+            # update with actual size if needed, "[...]T" types are interned only after that
             if at.len is None:
                 at.len = nb
+                vt = self.types.intern(at) if vt is at else vt
 
             # check for array size
             if at.len < nb:
@@ -1980,6 +2297,9 @@ class Inferrer:
         # create an empty type node before inferring recursively
         node.vt = factory()
         inferrer(self, ctx, node.vt, node)
+
+        # structurally identical types share the same instance
+        node.vt = self.types.intern(node.vt)
         return node.vt
 
     def _infer_type_name(self, ctx: Context, node: NamedTypeNode) -> Type:
@@ -1994,18 +2314,16 @@ class Inferrer:
         # types that defined in the current scope chain, or built-in types
         else:
             name = node.name.value
-            symbol = scope.resolve(name)
+            symbol = self._lookup(scope, node.name)
 
             # still not resolved, maybe defined in another file
             if symbol is None and name in ctx.fmap:
-                file = ctx.fmap[name]
-                rctx = self.Context(ctx.pkg, ctx.fmap, file)
+                decl = ctx.fmap[name]
+                rctx = self.Context(ctx.pkg, ctx.fmap, decl.file)
 
-                # find the type specifier
-                for spec in file.types:
-                    if spec.name.value == name:
-                        symbol = self._infer_type_spec(rctx, spec)
-                        break
+                # must be a type specifier
+                if isinstance(decl.spec, TypeSpec):
+                    symbol = self._infer_type_spec(rctx, decl.spec)
 
         # check the resolved type
         if symbol is None:
@@ -2068,6 +2386,7 @@ class Inferrer:
         # all tests have passed, they are identical struct types
         return True
 
+    @relation
     def _is_assignable(self, t: Type, x: Type) -> bool:
         """
         Type assignability check,
@@ -2115,6 +2434,7 @@ class Inferrer:
         else:
             return False
 
+    @relation
     def _is_comparable(self, t1: Type, t2: Type) -> bool:
         """
         Type comparability check,
@@ -2191,6 +2511,7 @@ class Inferrer:
         else:
             return False
 
+    @relation
     def _is_implements(self, vt: Type, intf: InterfaceType) -> bool:
         """
         Type implementation check,
@@ -2201,31 +2522,12 @@ class Inferrer:
         to implement the interface.
         """
 
-        # method buffer
-        tfs = []
-        vtype = vt
-
-        # pointer types, add method for it's element types
-        if isinstance(vtype, PtrType):
-            vtype = vtype.elem
-            tfs.extend(vtype.pfuncs)
-
-        # add type methods
-        ifs = intf.tfuncs[:]
-        tfs.extend(vtype.tfuncs)
-
-        # sort them by name
-        i = j = 0
-        ifs.sort(key = lambda x: x.name)
-        tfs.sort(key = lambda x: x.name)
-
-        # compare each method
-        while i < len(ifs) and j < len(tfs):
-            i += 1 if ifs[i] == tfs[j] else 0
-            j += 1
+        # method sets of both types
+        tfs = vt.methods()
+        ifs = self._type_deref(intf).methods()
 
         # `vt` implements `intf` iff `tfs` is a superset of `ifs`
-        return i == len(ifs)
+        return all(name in tfs and tfs[name] == func for name, func in ifs.items())
 
     def _is_addressable(self, x: Node) -> bool:
         """
@@ -2273,6 +2575,7 @@ class Inferrer:
         else:
             return False
 
+    @relation
     def _is_convertible(self, t: Type, x: Type) -> bool:
         """
         Type convertibility check,
@@ -2414,7 +2717,7 @@ class Inferrer:
                 if item.name == func.name:
                     raise self._error(decl.name, 'duplicated interface method: ' + func.name)
             else:
-                vtype.tfuncs.append(func)
+                vtype.add_method(func)
 
     def _infer_interface_type_method(self, ctx: Context, vtype: InterfaceType, decl: InterfaceMethodNode):
         ftype = FuncType()
@@ -2427,7 +2730,7 @@ class Inferrer:
 
         # infer the function type
         self._infer_function_type(ctx, ftype, decl)
-        vtype.tfuncs.append(Method(fname, ftype))
+        vtype.add_method(Method(fname, self.types.intern(ftype)))
 
     __type_factory__ = {
         MapTypeNode       : MapType,
@@ -2510,7 +2813,7 @@ class Inferrer:
             symbol = Symbols.Type(value, None)
             rstype = symbol
         else:
-            rstype = NamedType(value)
+            rstype = NamedType(value, pkg = ctx.pkg.path)
             symbol = Symbols.Type(value, rstype)
 
         # declare the type symbol
@@ -2583,14 +2886,7 @@ class Inferrer:
         else:
             print('* import C :: %s ...' % repr(imp.src[:64]))
 
-    def _infer_package(
-        self,
-        main   : bool,
-        path   : String,
-        trace  : List[str],
-        cache  : Dict[bytes, Optional[PackageScope]],
-        module : Optional[Module]
-    ) -> PackageScope:
+    def _check_package(self, path: String, trace: List[str]) -> str:
         try:
             name = path.value.decode('ascii')
         except UnicodeDecodeError:
@@ -2605,7 +2901,10 @@ class Inferrer:
         if name in trace:
             raise self._error(path, 'import cycle not allowed: %s' % repr(name))
 
-        # resolve the package
+        # all done
+        return name
+
+    def _lookup_package(self, name: str, path: String, module: Optional[Module]) -> Tuple[str, str]:
         root, fpath = Resolver.lookup(
             name   = name,
             proj   = self.proj,
@@ -2617,9 +2916,54 @@ class Inferrer:
         # check for package
         if root is None and fpath is None:
             raise self._error(path, 'cannot find package %s' % repr(name))
+        else:
+            return root, fpath
+
+    def _lookup_module(self, root: str, fpath: str, module: Optional[Module]) -> Optional[Module]:
+        this = fpath
+        fname = None
+
+        # only required in "go mod" mode
+        if self.mode != Mode.GO_MOD:
+            return module
+
+        # find the "go.mod"
+        while this != root:
+            fmod = os.path.join(this, 'go.mod')
+            this = os.path.dirname(this)
+
+            # found the file
+            try:
+                st = os.stat(fmod)
+            except OSError:
+                continue
+
+            # must be a regular file
+            if stat.S_ISREG(st.st_mode):
+                fname = fmod
+                break
 
-        # find all source files
-        files = list(self._parse_package(fpath, main))
+        # no "go.mod" found, use the module of the importer
+        if fname is None:
+            return module
+
+        # every "go.mod" is parsed only once until it changes
+        mod = self.gomods.get(fname)
+        key = (st.st_mtime_ns, st.st_size)
+
+        # check for the cached one
+        if mod is not None and mod[:2] == key:
+            return mod[2]
+
+        # parse the module
+        with open(fname, newline = None) as fp:
+            ret = Reader().parse(fp.read())
+
+        # keep it for later lookups
+        self.gomods[fname] = key + (ret,)
+        return ret
+
+    def _check_sources(self, name: str, path: String, files: List[Package]) -> str:
         names = sorted(set(file.name.value for file in files))
 
         # check for source files
@@ -2630,33 +2974,164 @@ class Inferrer:
         if len(names) != 1:
             raise self._error(path, 'multiple packages in directory: %s' % ', '.join(names))
 
-        # read "go.mod" in "go mod" mode
-        if self.mode == Mode.GO_MOD:
-            this = fpath
-            fname = None
+        # all done
+        return names[0]
+
+    def _scan_imports(
+        self,
+        main   : bool,
+        path   : String,
+        trace  : List[str],
+        graph  : ImportGraph,
+        locs   : LocationMap,
+        module : Optional[Module]
+    ) -> str:
+        name = self._check_package(path, trace)
+        deps = []
+
+        # already scanned
+        if name in graph:
+            return name
+
+        # the module of the first importer is used to resolve the package
+        root, fpath = self._lookup_package(name, path, module)
+        files = list(self._parse_package(fpath, main, header = True))
 
-            # find the "go.mod"
-            while this != root:
-                fmod = os.path.join(this, 'go.mod')
-                this = os.path.dirname(this)
+        # check the source files, and read the "go.mod" if any
+        self._check_sources(name, path, files)
+        module = self._lookup_module(root, fpath, module)
 
-                # found the file
-                if os.path.isfile(fmod):
-                    fname = fmod
-                    break
+        # keep the resolved location, so the inference does not need to resolve it again
+        locs[name] = (root, fpath, module)
 
-            # parse the module
-            if fname is not None:
-                with open(fname, newline = None) as fp:
-                    module = Reader().parse(fp.read())
+        # scan every import recursively
+        for file in files:
+            for imp in file.imports:
+                if imp.path.value != b'C' or not isinstance(imp.alias, ImportC):
+                    with Trace(trace, name):
+                        deps.append(self._scan_imports(False, imp.path, trace, graph, locs, module))
+
+        # add after all the dependencies, so the graph is in topological order
+        graph[name] = sorted(set(deps))
+        return name
+
+    def _import_package(
+        self,
+        name   : str,
+        path   : String,
+        trace  : List[str],
+        cache  : Dict[bytes, Optional[PackageScope]],
+        module : Optional[Module],
+        locs   : Optional[LocationMap]
+    ) -> PackageScope:
+        with Trace(trace, name):
+            if path.value in cache:
+                return cache[path.value]
+            else:
+                ret = cache[path.value] = self._infer_package(
+                    main   = False,
+                    path   = path,
+                    trace  = trace,
+                    cache  = cache,
+                    module = module,
+                    locs   = locs,
+                )
+
+        # all done
+        return ret
+
+    def _export_deps(
+        self,
+        name   : str,
+        srcs   : List[Tuple[str, str]],
+        trace  : List[str],
+        cache  : Dict[bytes, Optional[PackageScope]],
+        module : Optional[Module],
+        locs   : Optional[LocationMap]
+    ) -> Dict[bytes, PackageScope]:
+        deps = {}
+        files = self._parse_files(srcs, False, header = True)
+
+        # infer all the dependencies first, their export data are required to load this one
+        for file in files:
+            for imp in file.imports:
+                if imp.path.value != b'C' or not isinstance(imp.alias, ImportC):
+                    deps[imp.path.value] = self._import_package(name, imp.path, trace, cache, module, locs)
+
+        # dependencies are in a fixed order, so the references are exactly
+        # the same between the one that saves it and the one that loads it
+        return {key: deps[key] for key in sorted(deps)}
+
+    def _infer_package(
+        self,
+        main   : bool,
+        path   : String,
+        trace  : List[str],
+        cache  : Dict[bytes, Optional[PackageScope]],
+        module : Optional[Module],
+        locs   : Optional[LocationMap] = None
+    ) -> PackageScope:
+        key = None
+        refs = None
+        ctx = self._context()
+        name = self._check_package(path, trace)
+        loc = None if locs is None else locs.get(name)
+
+        # packages that are found by the import scanning are already resolved,
+        # otherwise find the package and read "go.mod" in "go mod" mode
+        if loc is not None:
+            _, fpath, module = loc
+        else:
+            root, fpath = self._lookup_package(name, path, module)
+            module = self._lookup_module(root, fpath, module)
+
+        # dependency packages might be inferred by previous runs
+        if not main and self.pkgs is not None:
+            ret = self.pkgs.get(fpath, ctx)
+            if ret is not None:
+                return ret
+
+        # select the source files
+        srcs = list(self._select_files(fpath))
+        size = sum(len(src) for _, src in srcs)
+
+        # dependency packages can be loaded from the export data
+        if not main and self.exps is not None:
+            deps = self._export_deps(name, srcs, trace, cache, module, locs)
+            refs = exports.references({dep: pkg.exports() for dep, pkg in deps.items()})
+
+            # changes of the dependencies can only be seen through their digests,
+            # so the export data is neither loaded nor saved without them
+            if all(pkg.digest is not None for pkg in deps.values()):
+                key = self.exps.key(
+                    ctx   = list(ctx),
+                    path  = name,
+                    files = srcs,
+                    deps  = [pkg.digest for pkg in deps.values()],
+                )
+
+            # load the export data, if any
+            ret = None if key is None else self.exps.load(key, refs)
+
+            # use the canonical types, and also keep it for later runs
+            if ret is not None:
+                ret = exports.intern(ret, refs, self.types)
+                if self.pkgs is not None:
+                    self.pkgs.put(fpath, ctx, ret, size, list(deps.values()))
+                return ret
+
+        # parse all source files
+        files = list(self._parse_files(srcs, main))
+        pname = self._check_sources(name, path, files)
 
         # check the package name
-        if names[0] == '_':
+        if pname == '_':
             raise self._error(files[0].name, 'invalid package name')
 
         # map file names to file objects, and create the meta package
         fmap = {}
-        package = PackageScope(names[0], name)
+        deps = []
+        package = PackageScope(pname, name)
 
         # phase 1: find out all imported packages
         for file in files:
@@ -2674,17 +3149,8 @@ class Inferrer:
                     continue
 
                 # infer dependency recursively, if not done before
-                with Trace(trace, name):
-                    if path in cache:
-                        pkg = cache[path]
-                    else:
-                        pkg = cache[path] = self._infer_package(
-                            main   = False,
-                            path   = imp.path,
-                            trace  = trace,
-                            cache  = cache,
-                            module = module,
-                        )
+                pkg = self._import_package(name, imp.path, trace, cache, module, locs)
+                deps.append(pkg)
 
                 # check for "." import
                 if not isinstance(alias, ImportHere):
@@ -2693,8 +3159,11 @@ class Inferrer:
                     else:
                         self._declare(syms, alias.value, alias, pkg)
                 else:
-                    for key, symbol in pkg.public.items():
-                        self._declare(syms, key, alias, symbol)
+                    dup = syms.include(pkg)
+
+                    # check for conflicting names
+                    if dup is not None:
+                        raise self._error(alias, '%s redeclared in this package' % repr(dup))
                     else:
                         self._declare(syms, InplaceGen.next(), alias, pkg)
 
@@ -2729,11 +3198,236 @@ class Inferrer:
                 if spec.vt is None:
                     self._infer_func_spec(self.Context(package, fmap, file), spec)
 
+        # save the export data
+        if key is not None:
+            package.digest = key
+            self.exps.save(key, package.exports(), refs)
+
+        # keep dependency packages for later runs
+        if not main and self.pkgs is not None:
+            self.pkgs.put(fpath, ctx, package, size, deps)
+
         # all done
         package.files = files
         return package
 
     ### Inferrer Interface ###
 
+    def _infer_parallel(self, paths: List[String]) -> Iterable[Tuple[str, PackageScope]]:
+        ctx = self._context()
+        conf = self._remote_config()
+        jobs = {}
+        locs = {}
+        graph = {}
+        cache = {}
+        roots = {}
+
+        # find out the whole import graph first
+        for path in paths:
+            roots[self._scan_imports(True, path, [], graph, locs, None)] = path
+
+        # packages that import each package
+        deps = {key: set(val) for key, val in graph.items()}
+        users = {key: [] for key in graph}
+        ready = [key for key, val in deps.items() if not val]
+
+        # build the reverse edges
+        for key, val in graph.items():
+            for dep in val:
+                users[dep].append(key)
+
+        # create the process pool on first use
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.jobs)
+
+        # infer the dependencies as soon as all of their imports are done
+        while ready or jobs:
+            done = []
+
+            # packages inferred by previous runs can be used directly
+            for key in ready:
+                pkg = None
+
+                # root packages are inferred locally with full ASTs
+                if key in roots:
+                    pkg = self._infer_package(True, roots[key], [], cache, None, locs)
+                    done.append((key, pkg))
+                    yield key, pkg
+                    continue
+                _, fpath, _ = locs[key]
+
+                # check the package cache, if any
+                if self.pkgs is not None:
+                    pkg = self.pkgs.get(fpath, ctx)
+
+                # otherwise infer it in the process pool
+                if pkg is not None:
+                    done.append((key, pkg))
+                else:
+                    data = {dep.encode('ascii'): cache[dep.encode('ascii')].exports() for dep in graph[key]}
+                    args = (conf, key, exports.dumps(data, exports.BUILTINS), locs[key])
+                    jobs[self.pool.submit(_infer_remote, *args)] = (key, fpath, data)
+
+            # wait for any of them, if nothing is done yet
+            if not done:
+                for job in cast(Set[Future], wait(jobs, return_when = FIRST_COMPLETED)[0]):
+                    ret = job.result()
+                    key, fpath, data = jobs.pop(job)
+
+                    # the exported symbols are loaded against the exact same objects that were sent,
+                    # and the types are replaced with the canonical ones of this process
+                    refs = exports.references(data)
+                    pkg = exports.intern(exports.loads(ret, refs), refs, self.types)
+                    done.append((key, pkg))
+
+                    # also keep it for later runs
+                    if self.pkgs is not None:
+                        self.pkgs.put(fpath, ctx, pkg, len(ret), [cache[dep.encode('ascii')] for dep in graph[key]])
+
+            # check for packages that are ready to infer
+            ready = []
+            for key, pkg in done:
+                cache[key.encode('ascii')] = pkg
+                for user in users[key]:
+                    deps[user].remove(key)
+                    if not deps[user]:
+                        ready.append(user)
+
+    def _infer_shared(self, path: String, sigs: Dict[Signature, int], pkgs: Dict[int, PackageScope]) -> PackageScope:
+        locs = {}
+        vals = {}
+        graph = {}
+        cache = {}
+
+        # find out the whole import graph first
+        name = self._scan_imports(True, path, [], graph, locs, None)
+
+        # the graph is in topological order, so the dependencies always go first
+        for key in graph:
+            _, fpath, _ = locs[key]
+            files = tuple(fname for fname, _ in self._select_files(fpath))
+
+            # packages with the same selected files and the same dependencies
+            # infer to the same result, no matter which target it is
+            sig = (key == name, fpath, files, tuple(vals[dep] for dep in graph[key]))
+            sid = vals[key] = sigs.setdefault(sig, len(sigs))
+
+            # infer the package only if no other targets have done so
+            if sid not in pkgs:
+                pkgs[sid] = self._infer_package(key == name, self._string(key), [], cache, None, locs)
+
+            # use the shared result for the importers
+            cache[key.encode('ascii')] = pkgs[sid]
+
+        # all done
+        return cache[name.encode('ascii')]
+
+    def _expand_pattern(self, pattern: str) -> Iterable[str]:
+        if not pattern.endswith('/...'):
+            yield pattern
+            return
+
+        # resolve the base package
+        name = pattern[:-4]
+        _, fpath = Resolver.lookup(
+            name  = name,
+            proj  = self.proj,
+            root  = self.root,
+            paths = self.paths,
+        )
+
+        # check for package
+        if fpath is None:
+            raise self._error(self._string(pattern), 'cannot find package %s' % repr(name))
+
+        # every directory with source files is a package, just like the "go" command,
+        # directories begin with "." or "_", "testdata" and "vendor" are ignored
+        for path, dirs, files in os.walk(fpath):
+            dirs[:] = sorted(v for v in dirs if v[:1] not in ('.', '_') and v not in ('testdata', 'vendor'))
+            rel = os.path.relpath(path, fpath)
+
+            # check for source files
+            if any(v.endswith('.go') and v[:1] not in ('.', '_') for v in files):
+                yield name if rel == '.' else '%s/%s' % (name, rel.replace(os.sep, '/'))
+
     def infer(self, path: str) -> PackageScope:
-        return self._infer_package(True, self._string(path), [], {}, None)
+        self._refresh()
+
+        # infer in the process pool if needed
+        if self.jobs <= 1:
+            return self._infer_package(True, self._string(path), [], {}, None)
+        else:
+            return dict(self._infer_parallel([self._string(path)]))[path]
+
+    def infer_all(self, patterns: List[str]) -> Iterable[Tuple[str, PackageScope]]:
+        locs = {}
+        graph = {}
+        cache = {}
+        roots = {}
+        paths = [self._string(v) for v in dict.fromkeys(v for pat in patterns for v in self._expand_pattern(pat))]
+
+        # every run checks the cached packages again
+        self._refresh()
+
+        # infer all the packages in one pass, dependencies are shared
+        if self.jobs > 1:
+            yield from self._infer_parallel(paths)
+            return
+
+        # find out the whole import graph first
+        for path in paths:
+            roots[self._scan_imports(True, path, [], graph, locs, None)] = path
+
+        # the import graph is in topological order, so packages that are imported
+        # by other packages are inferred before them, and only once
+        for key in graph:
+            if key in roots:
+                pkg = cache[key.encode('ascii')] = self._infer_package(True, roots[key], [], cache, None, locs)
+                yield key, pkg
+
+    def infer_targets(self, path: str, targets: List[Target]) -> List[PackageScope]:
+        ret = []
+        sigs = {}
+        pkgs = {}
+        asts = self.asts
+
+        # every file is parsed only once, other targets load a copy of the AST,
+        # since the ASTs are modified during inference
+        if asts is None:
+            asts = MemoryAstCache()
+
+        # every run checks the cached packages again
+        self._refresh()
+
+        # share the process pool with every target
+        if self.jobs > 1 and self.pool is None:
+            self.pool = ProcessPoolExecutor(self.jobs)
+
+        # infer the package for every target
+        for osn, arch, tags in targets:
+            ifr = Inferrer(osn, arch, self.proj, self.root, self.paths)
+            ifr.test = self.test
+            ifr.mode = self.mode
+            ifr.asts = asts
+            ifr.exps = self.exps
+            ifr.pkgs = self.pkgs
+            ifr.hdrs = self.hdrs
+            ifr.types = self.types
+            ifr.jobs = self.jobs
+            ifr.pool = self.pool
+            ifr.tags = set(tags)
+            ifr.backend = self.backend
+            ret.append(ifr._infer_shared(self._string(path), sigs, pkgs))
+
+        # all done
+        return ret
+
+    def imports(self, path: str) -> ImportGraph:
+        graph = {}
+        self._scan_imports(True, self._string(path), [], graph, {}, None)
+        return graph
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
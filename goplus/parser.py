@@ -1,6 +1,12 @@
 # -*- coding: utf-8 -*-
 
+from array import array
+from functools import wraps
+from functools import partial
+
+from typing import Any
 from typing import Set
+from typing import Dict
 from typing import List
 from typing import Type as Tp
 from typing import Tuple
@@ -95,9 +101,10 @@ from .ast import FunctionOptions
 from .ast import FunctionArgument
 from .ast import FunctionSignature
 
-from .tokenizer import State
 from .tokenizer import Token
 from .tokenizer import Tokenizer
+from .tokenizer import TokenArray
+from .tokenizer import TokenReplay
 
 from .tokenizer import TokenType
 from .tokenizer import TokenValue
@@ -170,6 +177,12 @@ BINARY_OPERATORS = [
     {'*' , '/' , '%', '<<', '>>', '&', '&^'},
 ]
 
+BINARY_PRECEDENCE = {
+    op: prec
+    for prec, ops in enumerate(BINARY_OPERATORS)
+    for op in ops
+}
+
 ESLICE_OPERATORS = {
     ':',
     ']',
@@ -212,36 +225,83 @@ def _is_end_token(tk: Token):
            (tk.kind == TokenType.Keyword and tk.value in END_KEYWORDS) or \
            (tk.kind == TokenType.Operator and tk.value in END_OPERATORS)
 
+def _memoized(func: Callable[['Parser'], Any]) -> Callable[['Parser'], Any]:
+    rule = func.__name__
+
+    # the result only depends on the token position and whether
+    # we are in control clauses, so it can be safely reused
+    #
+    # named types are cheap enough to parse again, and they are the most
+    # common ones, so don't bother memoizing them
+    @wraps(func)
+    def wrapper(self: 'Parser') -> Any:
+        if self._peek().kind == TokenType.Name:
+            return func(self)
+        else:
+            return self._memoize(rule, func)
+
+    # all done
+    return wrapper
+
 PState = Tuple[
-    State,
-    Token,
-    Token,
-    Token,
     int,
     int,
-    Token,
+    int,
+    int,
     FunctionOptions,
 ]
 
+MemoKey = Tuple[
+    str,
+    int,
+    bool,
+]
+
+MemoValue = Tuple[
+    Any,
+    int,
+    Optional[SyntaxError],
+]
+
 class Parser:
-    lx     : Tokenizer
-    expr   : int
-    iota   : int
-    last   : Optional[Token]
-    prev   : Optional[Token]
-    save   : Optional[Token]
-    block  : Optional[Token]
-    fflags : FunctionOptions
+    lx          : Tokenizer
+    pos         : int
+    expr        : int
+    iota        : int
+    last        : Optional[Token]
+    prev        : Optional[Token]
+    cmts        : List[Token]
+    cbeg        : int
+    memo        : Dict[MemoKey, MemoValue]
+    error       : Optional[SyntaxError]
+    floor       : int
+    fflags      : FunctionOptions
+    tokens      : TokenArray
+    counts      : array
+    starts      : array
+    memo_hits   : int
+    memo_misses : int
+    skip_bodies : bool
 
     __slots__ = (
         'lx',
+        'pos',
         'expr',
         'iota',
         'last',
         'prev',
-        'save',
-        'block',
+        'cmts',
+        'cbeg',
+        'memo',
+        'error',
+        'floor',
         'fflags',
+        'tokens',
+        'counts',
+        'starts',
+        'memo_hits',
+        'memo_misses',
+        'skip_bodies',
     )
 
     class Scope:
@@ -292,15 +352,29 @@ class Parser:
             self.ps.expr = -1
             return self
 
-    def __init__(self, lx: Tokenizer):
+    def __init__(self, lx: Tokenizer, skip_bodies: bool = False):
         self.lx     = lx
+        self.pos    = 0
         self.expr   = 0
         self.iota   = 0
         self.last   = None
         self.prev   = None
-        self.save   = None
-        self.block  = None
+        self.cmts   = []
+        self.cbeg   = 0
+        self.memo   = {}
+        self.error  = None
+        self.floor  = 0
         self.fflags = FunctionOptions(0)
+        self.tokens = TokenArray()
+        self.counts = array('i')
+        self.starts = array('i')
+
+        # memoization statistics
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+        # function bodies are parsed on first access in skeleton mode
+        self.skip_bodies = skip_bodies
 
     ### Tokenizer Interfaces ###
 
@@ -311,17 +385,14 @@ class Parser:
 
             # only combines comments when they are right next to each other
             if pr and pr.kind == tk.kind == TokenType.LF:
-                self.block = None
+                self.cbeg = len(self.cmts)
 
             # check for comments
             if tk.kind != TokenType.Comments:
                 return tk
 
-            # append to previous comment block
-            if self.block is None:
-                self.block = tk.copy()
-            else:
-                self.block.value += tk.value
+            # append to comment list
+            self.cmts.append(tk)
 
             # comments containing newline act like newlines
             if '\n' in tk.value:
@@ -350,19 +421,83 @@ class Parser:
         self.last = token
         return self.last
 
+    def _fill(self) -> Token:
+        if self.error is not None:
+            raise self.error.with_traceback(None)
+
+        # the tokenizer cannot resume after errors, so the error is kept
+        # and raised again, just like the tokenizer was rolled back and re-read
+        try:
+            if not self.tokens or self.tokens.kinds[-1] != TokenType.End:
+                tk = self._read()
+            else:
+                tk = self.tokens[len(self.tokens) - 1]
+        except SyntaxError as e:
+            self.error = e
+            raise
+
+        # tokens are read only once, with the comment block boundaries recorded,
+        # so backtracking is just moving the cursor, the tokens are kept in
+        # columns rather than objects, which is much more compact
+        self.tokens.append(tk)
+        self.counts.append(len(self.cmts))
+        self.starts.append(self.cbeg)
+        return tk
+
     def _next(self) -> Token:
-        if self.save is None:
-            return self._read()
-        else:
-            ret, self.save = self.save, None
-            return ret
+        ret = self._peek()
+        self.pos += 1
+        return ret
 
     def _peek(self) -> Token:
-        if self.save is not None:
-            return self.save
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
         else:
-            self.save = self._read()
-            return self.save
+            return self._fill()
+
+    def _comments(self) -> Optional[Token]:
+        idx = self.pos - 1
+        end = self.counts[idx]
+        beg = max(self.floor, self.starts[idx])
+
+        # no comments right before the current token
+        if beg >= end:
+            return None
+
+        # combine the comment block
+        ret = self.cmts[beg].copy()
+        ret.value = ''.join(tk.value for tk in self.cmts[beg:end])
+        return ret
+
+    def _drop_comments(self):
+        self.floor = self.counts[self.pos - 1]
+
+    def _memoize(self, rule: str, func: Callable[['Parser'], Any]) -> Any:
+        key = (rule, self.pos, self.expr < 0)
+        ret = self.memo.get(key)
+
+        # reuse the previous result, including failures
+        if ret is not None:
+            val, pos, exc = ret
+            self.memo_hits += 1
+
+            # failures are raised again, without the previous traceback
+            if exc is not None:
+                raise exc.with_traceback(None)
+            else:
+                self.pos = pos
+                return val
+
+        # not parsed before
+        try:
+            self.memo_misses += 1
+            val = func(self)
+        except SyntaxError as e:
+            self.memo[key] = (None, -1, e)
+            raise
+        else:
+            self.memo[key] = (val, self.pos, None)
+            return val
 
     def _error(self, tk: Token, msg: str) -> SyntaxError:
         return SyntaxError('%s:%d:%d: %s' % (tk.file, tk.row + 1, tk.col + 1, msg))
@@ -542,30 +677,6 @@ class Parser:
         else:
             return args[0]
 
-    ### Expression Prunning Function ###
-
-    def _trim_expression_tree(self, expr: Expression) -> Expression:
-        if isinstance(expr.left, Expression):
-            expr.left = self._trim_expression_tree(expr.left)
-
-        # prune right expression
-        if expr.right is not None:
-            expr.right = self._trim_expression_tree(expr.right)
-
-        # promote the left term if no operator and right term present
-        if expr.op is not None:
-            return expr
-        elif expr.right is not None:
-            return expr
-        elif isinstance(expr.left, Expression):
-            return expr.left
-        elif expr.left.mods:
-            return expr
-        elif isinstance(expr.left.val, Expression):
-            return expr.left.val
-        else:
-            return expr
-
     ### Basic Structure Parsers ###
 
     def _parse_svd(self) -> List[Name]:
@@ -699,6 +810,7 @@ class Parser:
 
     ### Literal Type Parser ###
 
+    @_memoized
     def _parse_literal_type(self) -> LiteralType:
         if self._should(self._peek(), TokenType.Keyword, 'map'):
             return self._parse_map_type()
@@ -906,6 +1018,7 @@ class Parser:
         },
     }
 
+    @_memoized
     def _parse_type(self) -> Type:
         tk = self._peek()
         parser = self.__type_parsers__.get(tk.kind)
@@ -1509,24 +1622,23 @@ class Parser:
 
     ### Language Structures --- Expressions ###
 
-    def _parse_expr(self, prec: int) -> Expression:
-        if prec >= len(BINARY_OPERATORS):
-            return self._parse_unary()
-        else:
-            return self._parse_binary(prec)
+    def _parse_operand(self) -> Expression:
+        tk = self._peek()
+        val = self._parse_primary()
+
+        # a primary without modifiers that wraps a nested expression
+        # is just the nested expression itself, no need to wrap it again
+        if not val.mods and isinstance(val.val, Expression):
+            return val.val
 
-    def _parse_term(self, prec: int, op: Token, val: Expression) -> Expression:
-        new = Expression(self._peek())
-        new.op = Operator(op)
-        new.left = val
-        new.right = self._parse_expr(prec)
-        return new
+        # wrap the primary in an expression
+        ret = Expression(tk)
+        ret.left = val
+        return ret
 
     def _parse_unary(self) -> Expression:
         if not self._is_ops(UNARY_OPERATORS):
-            ret = Expression(self._peek())
-            ret.left = self._parse_primary()
-            return ret
+            return self._parse_operand()
         else:
             tk = self._next()
             ret = Expression(tk)
@@ -1535,13 +1647,23 @@ class Parser:
             return ret
 
     def _parse_binary(self, prec: int) -> Expression:
-        ret = Expression(self._peek())
-        ret.left = self._parse_expr(prec + 1)
+        ret = self._parse_unary()
+        tk = self._peek()
 
-        # check for operators of this precedence
-        while self._is_ops(BINARY_OPERATORS[prec]):
-            tk = self._next()
-            ret = self._parse_term(prec + 1, tk, ret)
+        # precedence climbing, operators of lower precedence are left to the caller
+        while tk.kind == TokenType.Operator and BINARY_PRECEDENCE.get(tk.value, -1) >= prec:
+            self._next()
+            val = BINARY_PRECEDENCE[tk.value]
+
+            # the expression node is located at the right operand
+            new = Expression(self._peek())
+            new.op = Operator(tk)
+            new.left = ret
+            new.right = self._parse_binary(val + 1)
+
+            # operators of the same precedence are left-associative
+            ret = new
+            tk = self._peek()
 
         # all done
         return ret
@@ -1796,7 +1918,7 @@ class Parser:
                 args.append(self._parse_expression())
 
     def _parse_expression(self) -> Expression:
-        return self._trim_expression_tree(self._parse_expr(prec = 0))
+        return self._parse_binary(0)
 
     ### Top Level Parsers --- Functions & Methods ###
 
@@ -1809,8 +1931,13 @@ class Parser:
            (self._should(self._peek(), TokenType.Operator, '{')):
             raise self._error(self._peek(), 'can only use //go:noescape with external func implementations')
 
-        # otherwise, the body is optional
-        func.body = self._parse_function_body()
+        # skeleton mode only finds the range of the body, it will be parsed on demand
+        if self.skip_bodies and self._should(self._peek(), TokenType.Operator, '{'):
+            func.lazy_ = self._skip_function_body()
+        else:
+            func.body = self._parse_function_body()
+
+        # add to function list
         ret.append(func)
 
     def _parse_function_def(self) -> Function:
@@ -1834,6 +1961,31 @@ class Parser:
             else:
                 return self._parse_compound_statement()
 
+    def _skip_function_body(self) -> Callable[[], Optional[CompoundStatement]]:
+        nb = 0
+        st = self.pos
+
+        # match the braces, the tokens are kept for parsing it later
+        while True:
+            tk = self._next()
+            kind = tk.kind
+
+            # unterminated function body
+            if kind == TokenType.End:
+                raise self._error(tk, 'unexpected EOF')
+
+            # only the braces matters
+            if kind == TokenType.Operator:
+                if tk.value == '{':
+                    nb += 1
+                elif tk.value == '}':
+                    nb -= 1
+
+            # stop at the matching brace, only the tokens of the body are kept,
+            # so the parser itself can be released after parsing
+            if nb == 0:
+                return partial(_parse_skipped_body, self.tokens.slice(st, self.pos))
+
     ### Top Level Parsers --- Variables, Types, Constants & Imports ###
 
     def _parse_var_spec(self, tk: Token, ret: List[InitSpec], consts: bool):
@@ -1967,6 +2119,28 @@ class Parser:
             raise self._error(tk, 'unexpected keyword %s' % repr(tk.value))
 
     def parse(self) -> Package:
+        ret = self.parse_header()
+
+        # parse other top-level declarations
+        while True:
+            if self._should(self._peek(), TokenType.Directive):
+                self._parse_dir(self._next(), ret)
+            elif self._should(self._peek(), TokenType.Keyword):
+                self._parse_decl(self._next(), ret)
+                self._delimiter(';')
+            else:
+                break
+
+        # must be EOF, the memoized results are useless from now on
+        if self._should(self._peek(), TokenType.End):
+            self.memo.clear()
+            return ret
+
+        # otherwise it's an unexpected token
+        tk = self._next()
+        raise self._error(tk, 'unexpected token %s' % repr(tk))
+
+    def parse_header(self) -> Package:
         tk = self._next()
         tk = self._require(tk, TokenType.Keyword, 'package')
 
@@ -1975,7 +2149,7 @@ class Parser:
         ret.name = self._parse_name()
 
         # require a delimiter after package name
-        self.block = None
+        self._drop_comments()
         self._delimiter(';')
 
         # imports go before other declarations
@@ -1989,7 +2163,7 @@ class Parser:
 
             # special case of "import `C`"
             if len(imps) != 1 or imps[0].path.value != b'C':
-                self.block = None
+                self._drop_comments()
                 ret.imports.extend(imps)
                 continue
 
@@ -1998,48 +2172,31 @@ class Parser:
                 raise self._error(token, 'cannot rename import `C`')
 
             # special case of "import `C`" with no source
-            if self.block is not None:
-                spec = ImportC(self.block)
-            else:
-                spec = ImportC(Token(token.col, token.row, token.file, TokenType.Comments, ''))
+            block = self._comments()
+            block = block or Token(token.col, token.row, token.file, TokenType.Comments, '')
 
             # use the alias to store C source code
-            self.block = None
-            imps[0].alias = spec
+            self._drop_comments()
+            imps[0].alias = ImportC(block)
             ret.imports.append(imps[0])
 
-        # parse other top-level declarations
-        while True:
-            if self._should(self._peek(), TokenType.Directive):
-                self._parse_dir(self._next(), ret)
-            elif self._should(self._peek(), TokenType.Keyword):
-                self._parse_decl(self._next(), ret)
-                self._delimiter(';')
-            else:
-                break
-
-        # must be EOF
-        if self._should(self._peek(), TokenType.End):
-            return ret
-
-        # otherwise it's an unexpected token
-        tk = self._next()
-        raise self._error(tk, 'unexpected token %s' % repr(tk))
+        # stop right after the imports
+        self.memo.clear()
+        return ret
 
     ### State Management ###
 
     def save_state(self) -> PState:
         return (
-            self.lx.save_state(),
-            self.last,
-            self.prev,
-            self.save,
+            self.pos,
             self.iota,
             self.expr,
-            self.block,
+            self.floor,
             self.fflags,
         )
 
     def load_state(self, state: PState):
-        st, self.last, self.prev, self.save, self.iota, self.expr, self.block, self.fflags = state
-        self.lx.load_state(st)
+        self.pos, self.iota, self.expr, self.floor, self.fflags = state
+
+def _parse_skipped_body(tokens: TokenArray) -> Optional[CompoundStatement]:
+    return Parser(TokenReplay(tokens))._parse_function_body()
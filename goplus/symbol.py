@@ -132,7 +132,24 @@ BUILTIN_SYMBOLS = {
     'error'      : Symbols.Type('error' , Interfaces.Error),
 }
 
+class Binding(metaclass = StrictFields):
+    depth  : int                # depth of the block scope, -1 for symbols outside of block scopes
+    slot   : int                # slot index within the block scope
+    symbol : Optional[Symbol]   # symbols outside of block scopes are referenced directly
+
+    def __init__(self, depth: int, slot: int, symbol: Optional[Symbol] = None):
+        self.depth = depth
+        self.slot = slot
+        self.symbol = symbol
+
 class Scope(metaclass = StrictFields):
+    def bind(self, name: str) -> Optional[Binding]:
+        sym = self.resolve(name)
+        return None if sym is None else Binding(-1, -1, sym)
+
+    def load(self, bind: Binding) -> Symbol:
+        return bind.symbol
+
     def resolve(self, name: str) -> Optional[Symbol]:
         raise NotImplementedError
 
@@ -140,29 +157,99 @@ class Scope(metaclass = StrictFields):
         raise NotImplementedError
 
 class BlockScope(Scope):
-    parent  : Scope
-    symbols : Dict[str, Symbol]
+    depth  : int                    # number of enclosing block scopes
+    names  : Dict[str, int]         # symbol name to slot index
+    slots  : List[Symbol]           # symbols, in the order of declaration
+    frames : List['BlockScope']     # enclosing block scopes, outermost first, including this one
+    parent : Scope
+    views  : List['PackageScope']   # packages imported with "import . `pkg`"
 
     def __init__(self, parent: Scope):
+        self.names = {}
+        self.slots = []
+        self.views = []
         self.parent = parent
-        self.symbols = {}
+
+        # block scopes nested in another block scope
+        if isinstance(parent, BlockScope):
+            self.frames = parent.frames + [self]
+        else:
+            self.frames = [self]
+
+        # the depth of this scope
+        self.depth = len(self.frames) - 1
 
     def derive(self) -> 'BlockScope':
         return BlockScope(self)
 
-    def resolve(self, name: str) -> Optional[Symbol]:
-        if name in self.symbols:
-            return self.symbols[name]
+    def _frame(self, name: str) -> Optional['BlockScope']:
+        for scope in reversed(self.frames):
+            if name in scope.names:
+                return scope
         else:
-            return self.parent.resolve(name)
+            return None
+
+    def bind(self, name: str) -> Optional[Binding]:
+        scope = self._frame(name)
+
+        # found in one of the block scopes
+        if scope is not None:
+            return Binding(scope.depth, scope.names[name])
+
+        # exported symbols of the dot-imported packages, which are in the file scope
+        for pkg in self.frames[0].views:
+            if name in pkg.public:
+                return Binding(-1, -1, pkg.public[name])
+
+        # not found in any block scopes
+        return self.frames[0].parent.bind(name)
+
+    def load(self, bind: Binding) -> Symbol:
+        if bind.symbol is not None:
+            return bind.symbol
+        else:
+            return self.frames[bind.depth].slots[bind.slot]
+
+    def resolve(self, name: str) -> Optional[Symbol]:
+        scope = self._frame(name)
+
+        # bindings are only created for caching, the symbol is loaded directly here
+        if scope is not None:
+            return scope.slots[scope.names[name]]
+
+        # exported symbols of the dot-imported packages, which are in the file scope
+        for pkg in self.frames[0].views:
+            if name in pkg.public:
+                return pkg.public[name]
+
+        # not found in any block scopes
+        return self.frames[0].parent.resolve(name)
 
     def declare(self, name: str, sym: Symbol) -> bool:
-        if name in self.symbols:
+        if name in self.names:
+            return False
+        elif any(name in pkg.public for pkg in self.views):
             return False
         else:
-            self.symbols[name] = sym
+            self.names[name] = len(self.slots)
+            self.slots.append(sym)
             return True
 
+    def include(self, pkg: 'PackageScope') -> Optional[str]:
+        for syms in [self.names] + [v.public for v in self.views]:
+            if len(syms) < len(pkg.public):
+                dups = [key for key in syms if key in pkg.public]
+            else:
+                dups = [key for key in pkg.public if key in syms]
+
+            # the exported symbols must not conflict with any other names in the file scope
+            if dups:
+                return min(dups)
+
+        # the package is looked up as-is, without copying any symbols
+        self.views.append(pkg)
+        return None
+
 class GlobalScope(Scope):
     def resolve(self, name: str) -> Optional[Symbol]:
         return BUILTIN_SYMBOLS.get(name, None)
@@ -172,6 +259,7 @@ class GlobalScope(Scope):
 
 class PackageScope(Scope, Symbols.Package):
     path    : str                       # package path, like "example.com/example/pkg"
+    digest  : Optional[str]             # export cache key (hash of the sources and dependency digests), if enabled
     files   : List[Package]             # parsed AST roots
     parent  : GlobalScope               # parent scope (must be `GlobalScope`)
     public  : Dict[str, Symbol]         # exported symbols of this package
@@ -183,6 +271,12 @@ class PackageScope(Scope, Symbols.Package):
         self.parent = GlobalScope()
         super().__init__(name, None)
 
+    def exports(self) -> 'PackageScope':
+        ret = PackageScope(self.name, self.path)
+        ret.digest = self.digest
+        ret.public = self.public
+        return ret
+
     def source(self, name: str) -> Scope:
         if name in self.private:
             return self.private[name]
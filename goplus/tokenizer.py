@@ -1,10 +1,18 @@
 # -*- coding: utf-8 -*-
 
 import re
+import mmap
+import codecs
 
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+from typing import Dict
 from typing import List
 from typing import Tuple
 from typing import Union
+from typing import Pattern
 from typing import Optional
 
 from string import digits
@@ -37,6 +45,124 @@ class State:
         ret.pos = self.pos
         return ret
 
+class LineIndex:
+    src   : str
+    rows  : Optional[List[int]]
+    last  : int
+    maps  : List[int]
+    info  : List[Tuple[int, int, int, str]]
+
+    __slots__ = (
+        'src',
+        'rows',
+        'last',
+        'maps',
+        'info',
+    )
+
+    def __init__(self, src: str, fname: str):
+        self.src = src
+        self.rows = None
+        self.last = 0
+        self.maps = [0]
+        self.info = [(0, 0, 0, fname)]
+
+    def _line(self, pos: int) -> int:
+        idx = self.last
+        rows = self.rows
+
+        # build the line-start table on first use
+        if rows is None:
+            rows = self.rows = self._build()
+
+        # most lookups are on the same line with the previous one
+        if rows[idx] <= pos < rows[idx + 1]:
+            return idx
+
+        # otherwise search for it
+        idx = bisect_right(rows, pos) - 1
+        self.last = idx
+        return idx
+
+    def _build(self) -> List[int]:
+        ret = [0]
+        ret.extend(accumulate((len(v) + 1 for v in self.src.split('\n'))))
+
+        # the last item is a sentinel which is greater
+        # than any valid offset, to simplify the range check
+        return ret
+
+    def _width(self, line: int, pos: int, end: int) -> int:
+        return end - pos
+
+    def remap(self, pos: int, row: int, col: int, fname: str):
+        if pos > self.maps[-1]:
+            self.maps.append(pos)
+            self.info.append((self._line(pos), row, col, fname))
+
+    def locate(self, pos: int) -> Tuple[int, int, str]:
+        line = self._line(pos)
+        maps = self.maps
+
+        # fast path: no line directives at all
+        if len(maps) == 1:
+            return line, self._width(line, self.rows[line], pos), self.info[0][3]
+
+        # find the nearest line directive before the offset
+        idx = bisect_right(maps, pos) - 1
+        base, row, col, fname = self.info[idx]
+
+        # columns are only shifted on the same line with the directive
+        if line == base:
+            return row, col + self._width(line, maps[idx], pos), fname
+        else:
+            return row + line - base, self._width(line, self.rows[line], pos), fname
+
+class BytesLineIndex(LineIndex):
+    cols: Dict[int, Optional[array]]
+
+    __slots__ = (
+        'cols',
+    )
+
+    def __init__(self, src: bytes, fname: str):
+        self.cols = {}
+        super().__init__(src, fname)
+
+    def _build(self) -> List[int]:
+        ret = [0]
+        ret.extend((m.end() for m in BYTES_NEWLINE.finditer(self.src)))
+
+        # add the sentinel
+        ret.append(len(self.src) + 1)
+        return ret
+
+    def _columns(self, line: int) -> Optional[array]:
+        start = self.rows[line]
+        data = self.src[start:self.rows[line + 1]]
+
+        # pure ASCII lines have one char per byte, so no table is needed
+        if BYTES_NONASCII.search(data) is None:
+            return None
+
+        # char offset of every byte offset within the line, UTF-8 continuation bytes don't start a new char
+        ret = array('l', [0])
+        ret.extend(accumulate((v & 0xc0) != 0x80 for v in data))
+        return ret
+
+    def _width(self, line: int, pos: int, end: int) -> int:
+        try:
+            tab = self.cols[line]
+        except KeyError:
+            tab = self.cols[line] = self._columns(line)
+
+        # columns of pure ASCII lines are just the byte offsets
+        if tab is None:
+            return end - pos
+        else:
+            start = self.rows[line]
+            return tab[end - start] - tab[pos - start]
+
 class Token:
     col   : int
     row   : int
@@ -68,55 +194,125 @@ class Token:
     def copy(self) -> 'Token':
         return Token(self.col, self.row, self.file, self.kind, self.value)
 
+    @classmethod
+    def make(cls, tk: 'Tokenizer', kind: 'TokenType', value: 'TokenValue') -> 'Token':
+        if tk.lazy:
+            return LazyToken(tk.mark, tk.lines, kind, value)
+        else:
+            row, col, fname = tk.lines.locate(tk.mark)
+            return cls(col, row, fname, kind, value)
+
     @classmethod
     def eol(cls, tk: 'Tokenizer'):
-        return cls(tk.save.col, tk.save.row, tk.file, TokenType.LF, None)
+        return cls.make(tk, TokenType.LF, None)
 
     @classmethod
     def end(cls, tk: 'Tokenizer'):
-        return cls(tk.save.col, tk.save.row, tk.file, TokenType.End, None)
+        return cls.make(tk, TokenType.End, None)
 
     @classmethod
     def int(cls, tk: 'Tokenizer', value: int):
-        return cls(tk.save.col, tk.save.row, tk.file, TokenType.Int, value)
+        return cls.make(tk, TokenType.Int, value)
 
     @classmethod
     def rune(cls, tk: 'Tokenizer', value: bytes):
         if len(value) == 1:
-            return cls(tk.save.col, tk.save.row, tk.file, TokenType.Rune, value[0])
+            return cls.make(tk, TokenType.Rune, value[0])
         else:
-            return cls(tk.save.col, tk.save.row, tk.file, TokenType.Rune, ord(value.decode('utf-8')))
+            return cls.make(tk, TokenType.Rune, ord(value.decode('utf-8')))
 
     @classmethod
     def ident(cls, tk: 'Tokenizer', value: str):
         if value not in KEYWORDS:
-            return cls(tk.save.col, tk.save.row, tk.file, TokenType.Name, value)
+            return cls.make(tk, TokenType.Name, value)
         else:
-            return cls(tk.save.col, tk.save.row, tk.file, TokenType.Keyword, value)
+            return cls.make(tk, TokenType.Keyword, value)
 
     @classmethod
     def float(cls, tk: 'Tokenizer', value: float):
-        return cls(tk.save.col, tk.save.row, tk.file, TokenType.Float, value)
+        return cls.make(tk, TokenType.Float, value)
 
     @classmethod
     def string(cls, tk: 'Tokenizer', value: bytes):
-        return cls(tk.save.col, tk.save.row, tk.file, TokenType.String, value)
+        return cls.make(tk, TokenType.String, value)
 
     @classmethod
     def complex(cls, tk: 'Tokenizer', value: complex):
-        return cls(tk.save.col, tk.save.row, tk.file, TokenType.Complex, value)
+        return cls.make(tk, TokenType.Complex, value)
 
     @classmethod
     def operator(cls, tk: 'Tokenizer', value: str):
-        return cls(tk.save.col, tk.save.row, tk.file, TokenType.Operator, value)
+        return cls.make(tk, TokenType.Operator, value)
 
     @classmethod
     def comments(cls, tk: 'Tokenizer', value: str):
-        return cls(tk.save.col, tk.save.row, tk.file, TokenType.Comments, value)
+        return cls.make(tk, TokenType.Comments, value)
 
     @classmethod
     def directive(cls, tk: 'Tokenizer', value: 'Directive'):
-        return cls(tk.save.col, tk.save.row, tk.file, TokenType.Directive, value)
+        return cls.make(tk, TokenType.Directive, value)
+
+class LazyToken(Token):
+    pos   : int
+    lines : LineIndex
+
+    __slots__ = (
+        'pos',
+        'lines',
+    )
+
+    def __init__(self, pos: int, lines: LineIndex, kind: 'TokenType', value: 'TokenValue'):
+        self.pos = pos
+        self.kind = kind
+        self.lines = lines
+        self.value = value
+
+    @property
+    def row(self) -> int:
+        return self.lines.locate(self.pos)[0]
+
+    @property
+    def col(self) -> int:
+        return self.lines.locate(self.pos)[1]
+
+    @property
+    def file(self) -> str:
+        return self.lines.locate(self.pos)[2]
+
+class SliceToken(LazyToken):
+    src   : 'Source'
+    raw   : bool
+    start : int
+    end   : int
+
+    __slots__ = (
+        'src',
+        'raw',
+        'start',
+        'end',
+    )
+
+    def __init__(self, tk: 'BytesTokenizer', start: int, end: int, raw: bool):
+        self.pos = tk.mark
+        self.src = tk.src
+        self.raw = raw
+        self.end = end
+        self.kind = TokenType.String
+        self.lines = tk.lines
+        self.start = start
+
+    @property
+    def value(self) -> bytes:
+        ret = self.src[self.start:self.end]
+
+        # carriage returns are discarded from raw strings, and escape
+        # sequences in interpreted strings have already been validated
+        if self.raw:
+            return ret.replace(b'\r', b'')
+        elif b'\\' not in ret:
+            return ret
+        else:
+            return codecs.escape_decode(ret)[0]
 
 class NoSplitDirective:
     def __repr__(self) -> str:
@@ -139,6 +335,12 @@ Directive = Union[
     LinkNameDirective,
 ]
 
+Source = Union[
+    bytes,
+    mmap.mmap,
+    bytearray,
+]
+
 class TokenType(IntEnum):
     LF        = 0
     End       = 1
@@ -196,7 +398,7 @@ KEYWORDS = {
     'var',
 }
 
-OPERATORS = build_from({
+OPERATOR_SET = {
     '+',
     '-',
     '*',
@@ -244,7 +446,9 @@ OPERATORS = build_from({
     '.',
     ';',
     ':',
-})
+}
+
+OPERATORS = build_from(OPERATOR_SET)
 
 STD_ESCAPE = {
     '"'  : b'"',
@@ -259,49 +463,108 @@ STD_ESCAPE = {
     '\\' : b'\\',
 }
 
-IDENT_REMS  = re.compile(r'\w', re.U)
 IDENT_FIRST = re.compile(r'[^\W\d]', re.U)
 
-class _GotComments(BaseException):
-    text: str
-
-    def __init__(self, text: str):
-        self.text = text
-
-class _GotDirective(BaseException):
-    pragma: Directive
-
-    def __init__(self, pragma: Directive):
-        self.pragma = pragma
+# anchored patterns used by the scanner, each of them matches a whole
+# lexeme starting from a given offset, so we don't have to read char by char
+#
+# notice: `string.digits` is ASCII-only, while `\d` matches any Unicode digits,
+# so the numeric patterns must use explicit character classes
+SCAN_BLANKS   = re.compile(r'[^\S\n]+', re.U)
+SCAN_IDENTS   = re.compile(r'[^\W\d]\w*', re.U)
+SCAN_BINARY   = re.compile(r'[01]*')
+SCAN_OCTAL    = re.compile(r'[0-7]*')
+SCAN_HEXDEC   = re.compile(r'[0-9a-fA-F]*')
+SCAN_DECIMAL  = re.compile(r'[0-9]*(?P<frac>\.[0-9]*)?(?P<exp>[eE][+-]?(?P<digits>[0-9]*))?(?P<imag>i)?')
+SCAN_OPERATOR = re.compile('|'.join(map(re.escape, sorted(OPERATOR_SET, key = len, reverse = True))))
+
+# every Unicode space except the new-line, there are none above U+3000
+UNICODE_SPACES = [chr(v) for v in range(0x3001) if chr(v).isspace() and v != 0x0a]
+
+# bytes version of the patterns above, used by the bytes-mode tokenizer, all
+# the non-ASCII bytes are accepted as identifier chars and checked again later
+BYTES_NEWLINE  = re.compile(b'\n')
+BYTES_NONASCII = re.compile(b'[\x80-\xff]')
+BYTES_BLANKS   = re.compile(b'(?:%s)+' % b'|'.join(re.escape(v.encode('utf-8')) for v in UNICODE_SPACES))
+BYTES_IDENTS   = re.compile(b'[A-Za-z_\x80-\xff][0-9A-Za-z_\x80-\xff]*')
+BYTES_BINARY   = re.compile(SCAN_BINARY.pattern.encode('ascii'))
+BYTES_OCTAL    = re.compile(SCAN_OCTAL.pattern.encode('ascii'))
+BYTES_HEXDEC   = re.compile(SCAN_HEXDEC.pattern.encode('ascii'))
+BYTES_DECIMAL  = re.compile(SCAN_DECIMAL.pattern.encode('ascii'))
+BYTES_OPERATOR = re.compile(SCAN_OPERATOR.pattern.encode('ascii'))
+
+# string bodies with only the escape sequences that are identical in Python,
+# so they can be decoded with `codecs.escape_decode`, octal escapes greater than
+# 255 and Unicode escapes are left to the slow path to report errors
+BYTES_STRING   = re.compile(rb'[^"\\]*(?:\\(?:[abfnrtv\\\'"]|x[0-9a-fA-F]{2}|[0-3][0-7]{2})[^"\\]*)*"')
+
+# chars of single bytes, indexing this is cheaper than calling `chr`
+BYTES_CHARS = tuple(map(chr, range(256)))
 
 class Tokenizer:
-    src   : str
-    file  : str
-    save  : State
-    state : State
+    src      : str
+    pos      : int
+    mark     : int
+    lazy     : bool
+    lines    : LineIndex
+    comments : bool
 
     __slots__ = (
         'src',
-        'file',
-        'save',
-        'state',
+        'pos',
+        'mark',
+        'lazy',
+        'lines',
+        'comments',
     )
 
-    def __init__(self, src: str, fname: str):
+    # patterns for numbers and operators, they are all ASCII,
+    # the bytes-mode tokenizer uses the bytes version of them
+    scan_binary   = SCAN_BINARY
+    scan_octal    = SCAN_OCTAL
+    scan_hexdec   = SCAN_HEXDEC
+    scan_decimal  = SCAN_DECIMAL
+    scan_operator = SCAN_OPERATOR
+
+    def __init__(self, src: str, fname: str, lazy: bool = False, comments: bool = True):
+        self.pos = 0
         self.src = src
-        self.file = fname
-        self.save = State()
-        self.state = State()
+        self.mark = 0
+        self.lazy = lazy
+        self.comments = comments
 
         # force a new-line after source
         if not self.src.endswith('\n'):
             self.src += '\n'
 
+        # row and column numbers are resolved from offsets only when needed,
+        # in lazy mode, this is deferred until someone reads it from the token
+        self.lines = LineIndex(self.src, fname)
+
     def _error(self, msg: str) -> SyntaxError:
-        return SyntaxError('%s:%d:%d: %s' % (self.file, self.save.row + 1, self.save.col + 1, msg))
+        row, col, fname = self.lines.locate(self.mark)
+        return SyntaxError('%s:%d:%d: %s' % (fname, row + 1, col + 1, msg))
+
+    def _state(self, pos: int) -> State:
+        ret = State()
+        ret.pos = pos
+        ret.row, ret.col, _ = self.lines.locate(pos)
+        return ret
+
+    def _char(self, pos: int) -> str:
+        return self.src[pos]
+
+    def _find(self, sub: str, pos: int, end: int) -> int:
+        return self.src.find(sub, pos, end)
+
+    def _slice(self, pos: int, end: int) -> str:
+        return self.src[pos:end]
+
+    def _bytes(self, pos: int, end: int) -> bytes:
+        return self.src[pos:end].encode('utf-8')
 
     def _curr_char(self) -> str:
-        return self.src[self.state.pos]
+        return self.src[self.pos]
 
     def _peek_char(self) -> str:
         if self.is_eof:
@@ -313,77 +576,80 @@ class Tokenizer:
         if self.is_eof:
             return ''
 
-        # read current char
-        st = self.state
-        ch = self.src[st.pos]
-
-        # check for new line
-        if ch != '\n':
-            st.col += 1
-        else:
-            st.col = 0
-            st.row += 1
-
-        # advance read pointer
-        st.pos += 1
+        # read current char, and advance read pointer
+        ch = self.src[self.pos]
+        self.pos += 1
         return ch
 
     def _skip_eol(self) -> str:
-        pos = self.state.pos
-        end = self.src.find('\n', pos)
-
-        # adjust state
-        self.state.pos = end
-        self.state.col += end - pos
+        pos = self.pos
+        end = self._find('\n', pos, len(self.src))
 
         # slice directly from source
         # this is way faster than read char by char
-        return self.src[pos:end]
+        self.pos = end
+        return self._slice(pos, end)
 
     def _skip_char(self) -> str:
-        self.save.col = self.state.col
-        self.save.row = self.state.row
-        self.save.pos = self.state.pos
+        self.mark = self.pos
         return self._next_char()
 
-    def _skip_space(self, ch: str) -> str:
-        while ch.isspace() and (ch != '\n'):
-            ch = self._skip_char()
-        else:
-            return ch
+    def _skip_space(self):
+        mat = SCAN_BLANKS.match(self.src, self.pos)
+
+        # skip the whole run of blanks at once
+        if mat is not None:
+            self.pos = mat.end()
 
-    def _skip_blanks(self) -> str:
+    def _skip_blanks(self) -> Optional[Token]:
         while True:
-            ch = self._skip_char()
-            ch = self._skip_space(ch)
+            self._skip_space()
+            ch = self._peek_char()
 
             # unix style comments
             if ch == '#':
                 self._skip_eol()
                 continue
 
-            # check for possible comments
-            if ch != '/' or (self._peek_char() not in ('*', '/')):
-                return ch
+            # check for possible comments, the source always ends with a new-line,
+            # so there is always a character after the '/' character
+            if ch != '/' or self._char(self.pos + 1) not in ('*', '/'):
+                return None
+
+            # skip the comment leader
+            self._skip_char()
+            ret = None
 
             # line comments
             if self._next_char() == '/':
                 if not self._check_sol() or not self._check_prefix('go:', 'line '):
-                    raise _GotComments(self._skip_eol())
+                    ret = self._comments(self._skip_eol(), block = False)
                 else:
-                    self._handle_directives(self._skip_eol(), block = False)
-                    continue
+                    ret = self._handle_directives(self._skip_eol(), block = False)
 
-            # locate the comment end
-            pos = self.state.pos
-            end = self.src.find('*/', pos)
-            ret = self._read_fast(pos, end, 2)
-
-            # special case for 'line' directive
-            if not ret.startswith('line '):
-                raise _GotComments(ret)
+            # block comments, with special case for 'line' directive
             else:
-                self._handle_directives(ret, block = True)
+                pos = self.pos
+                end = self._find('*/', pos, len(self.src))
+                cmt = self._read_fast(pos, end, 2)
+
+                # check for directives
+                if not cmt.startswith('line '):
+                    ret = self._comments(cmt, block = True)
+                else:
+                    ret = self._handle_directives(cmt, block = True)
+
+            # skip the comment if nothing is generated
+            if ret is not None:
+                return ret
+
+    def _comments(self, text: str, block: bool) -> Optional[Token]:
+        if self.comments:
+            return Token.comments(self, text)
+        elif block and '\n' in text:
+            return Token.eol(self)
+        else:
+            return None
 
     def _read_rune(self, ch: str) -> bytes:
         if ch != '\\':
@@ -392,27 +658,17 @@ class Tokenizer:
             return self._read_escape(self._next_char())
 
     def _read_fast(self, pos: int, end: int, tail: int) -> str:
-        ret = self.src[pos:end]
-        nnl, end = ret.count('\n'), end + tail
-
-        # adjust column based on new-line count
-        if nnl > 0:
-            self.state.col = -ret.rfind('\n') - 1
-
-        # adjust tokenizer state
-        self.state.pos = end
-        self.state.row += nnl
-        self.state.col += end - pos
-        return ret
+        self.pos = end + tail
+        return self._slice(pos, end)
 
     def _read_until(self, quote: str, delim: Optional[str] = None) -> Tuple[str, bytes]:
-        pos = self.state.pos
-        end = self.src.find(quote, pos)
+        pos = self.pos
+        end = self._find(quote, pos, len(self.src))
 
-        # also consider delimiter, if any
+        # also consider delimiter before the quote, if any
         if delim is not None:
-            dps = self.src.find(delim, pos)
-            end = dps if end < 0 else end if dps < 0 else min(dps, end)
+            dps = self._find(delim, pos, len(self.src) if end < 0 else end)
+            end = end if dps < 0 else dps
 
         # doesn't find anything
         if end < 0:
@@ -420,10 +676,8 @@ class Tokenizer:
 
         # slice directly from source
         # this increases performance drastically
-        return (
-            self.src[end],
-            self._read_fast(pos, end, 1).encode('utf-8'),
-        )
+        self.pos = end + 1
+        return self._char(end), self._bytes(pos, end)
 
     def _read_digit(self, name: str, charset: str) -> str:
         if self.is_eof or self._curr_char() not in charset:
@@ -477,35 +731,37 @@ class Tokenizer:
             raise self._error('invalid Unicode code point')
 
     def _check_sol(self) -> bool:
-        if self.state.pos == 0:
+        if self.pos == 0:
             return True
-        elif self.state.pos < 3:
+        elif self.pos < 3:
             return False
         else:
-            return self.src[self.state.pos - 3] == '\n'
+            return self._char(self.pos - 3) == '\n'
 
     def _check_prefix(self, *pfx: str) -> bool:
         for p in pfx:
-            if self.src[self.state.pos:self.state.pos + len(p)] == p:
+            if self._slice(self.pos, self.pos + len(p)) == p:
                 return True
         else:
             return False
 
-    def _handle_directives(self, cdir: str, block: bool):
+    def _handle_directives(self, cdir: str, block: bool) -> Optional[Token]:
         if cdir == 'go:nosplit':
-            raise _GotDirective(NoSplitDirective())
+            return Token.directive(self, NoSplitDirective())
         elif cdir == 'go:noescape':
-            raise _GotDirective(NoEscapeDirective())
+            return Token.directive(self, NoEscapeDirective())
         elif cdir.startswith('line '):
-            self._handle_directives_line(cdir, cdir[5:].rsplit(':', 2), block)
+            return self._handle_directives_line(cdir, cdir[5:].rsplit(':', 2), block)
         elif cdir.startswith('go:linkname '):
-            self._handle_directives_linkname(cdir, list(filter(None, cdir[12:].split(' '))))
+            return self._handle_directives_linkname(cdir, list(filter(None, cdir[12:].split(' '))), block)
+        else:
+            return None
 
-    def _handle_directives_line(self, cdir: str, args: List[str], block: bool):
+    def _handle_directives_line(self, cdir: str, args: List[str], block: bool) -> Optional[Token]:
         try:
             row = int(args[-1])
         except ValueError:
-            raise _GotComments(cdir)
+            return self._comments(cdir, block)
 
         # check tokenizer state
         if not block and self._next_char() != '\n':
@@ -513,30 +769,29 @@ class Tokenizer:
 
         # row number must be greater than 0
         if row <= 0:
-            raise _GotComments(cdir)
+            return self._comments(cdir, block)
 
-        # adjust the row number
-        st = self.state
-        st.row = row - 1
+        # current position, the column number is kept if not specified
+        pos = self.pos
+        _, col, fname = self.lines.locate(pos)
 
         # check for column number
         if len(args) <= 2 or not args[-2].isdigit() or int(args[-2]) <= 0:
-            name = ':'.join(args[:-1])
+            row, name = row - 1, ':'.join(args[:-1])
         else:
-            name = ':'.join(args[:-2])
-            st.row, st.col = int(args[-2]) - 1, st.row
+            row, col, name = int(args[-2]) - 1, row - 1, ':'.join(args[:-2])
 
-        # check for file name
-        if name:
-            self.file = name
+        # remap all the following positions
+        self.lines.remap(pos, row, col, name or fname)
+        return None
 
-    def _handle_directives_linkname(self, cdir: str, args: List[str]):
+    def _handle_directives_linkname(self, cdir: str, args: List[str], block: bool) -> Optional[Token]:
         if len(args) != 2:
-            raise _GotComments(cdir)
+            return self._comments(cdir, block)
         else:
             ret = LinkNameDirective()
             ret.name, ret.link = args
-            raise _GotDirective(ret)
+            return Token.directive(self, ret)
 
     def _parse(self, ch: str) -> Token:
         if not ch:
@@ -590,7 +845,6 @@ class Tokenizer:
         return Token.string(self, ret + buf)
 
     def _parse_number(self, first: str) -> Token:
-        ret = first
         nch = self._peek_char()
 
         # special case of leading zero
@@ -599,26 +853,30 @@ class Tokenizer:
                 return Token.int(self, 0)
             elif nch in 'bB':
                 self._next_char()
-                return self._parse_number_charset('binary', 2, '01')
+                return self._parse_number_charset('binary', 2, self.scan_binary)
             elif nch in 'oO':
                 self._next_char()
-                return self._parse_number_charset('octal', 8, octdigits)
+                return self._parse_number_charset('octal', 8, self.scan_octal)
             elif nch in 'xX':
                 self._next_char()
-                return self._parse_number_charset('hex', 16, hexdigits)
-
-        # scan each digit
-        while nch and nch in digits:
-            ret += self._next_char()
-            nch = self._peek_char()
-
-        # check for decimal point, complex numbers and scientific notation
-        if nch == '.':
-            return self._parse_number_float(ret)
-        elif nch == 'i':
-            return self._parse_number_complex(ret)
-        elif nch in ('e', 'E'):
-            return self._parse_number_science(ret)
+                return self._parse_number_charset('hex', 16, self.scan_hexdec)
+
+        # match the whole literal, including the first char
+        mat = self.scan_decimal.match(self.src, self.mark)
+        ret = self._slice(self.mark, mat.end())
+
+        # commit the literal
+        self.pos = mat.end()
+
+        # exponent must contains at least 1 digit
+        if mat.group('exp') is not None and not mat.group('digits'):
+            raise self._error('invalid float literal')
+
+        # check for complex numbers, decimal point and scientific notation
+        if mat.group('imag') is not None:
+            return Token.complex(self, float(ret[:-1]) * 1j)
+        elif mat.group('frac') is not None or mat.group('exp') is not None:
+            return Token.float(self, float(ret))
         elif ret[0] != '0':
             return Token.int(self, int(ret, 10))
         elif all((x in octdigits for x in ret)):
@@ -626,128 +884,462 @@ class Tokenizer:
         else:
             raise self._error('invalid octal digit')
 
-    def _parse_number_float(self, first: str) -> Token:
-        rem = self._next_char()
+    def _parse_number_charset(self, name: str, base: int, charset: Pattern) -> Token:
+        mat = charset.match(self.src, self.pos)
+        ret = self._slice(self.pos, mat.end())
+
+        # commit the digits
+        self.pos = mat.end()
         nch = self._peek_char()
 
-        # scan every digit
-        while nch and nch in digits:
-            rem += self._next_char()
-            nch = self._peek_char()
+        # check for result
+        if not ret or (nch and nch in hexdigits):
+            raise self._error('invalid %s digit' % name)
+        else:
+            return Token.int(self, int(ret, base))
+
+    def _parse_decimal(self) -> Token:
+        if self.is_eof or self._curr_char() not in digits:
+            return self._parse_operator('.')
+        else:
+            return self._parse_number('.')
+
+    def _parse_operator(self, _: str) -> Token:
+        mat = self.scan_operator.match(self.src, self.mark)
+        end = mat.end()
+
+        # the pattern prefers longer operators, and in Golang, the first
+        # character of every multi-char operator is a valid operator by it's own
+        self.pos = end
+        return Token.operator(self, self._slice(self.mark, end))
 
-        # check for complex numbers, and scientific notation
-        if nch == 'i':
-            return self._parse_number_complex(first + rem)
-        elif nch in ('e', 'E'):
-            return self._parse_number_science(first + rem)
+    def _parse_identifier(self, _: str) -> Token:
+        mat = SCAN_IDENTS.match(self.src, self.mark)
+        end = mat.end()
+
+        # the first character has already been checked
+        self.pos = end
+        return Token.ident(self, mat.group())
+
+    @property
+    def file(self) -> str:
+        return self.lines.locate(self.mark)[2]
+
+    @property
+    def save(self) -> State:
+        return self._state(self.mark)
+
+    @property
+    def state(self) -> State:
+        return self._state(self.pos)
+
+    @property
+    def is_eof(self):
+        return self.pos >= len(self.src)
+
+    def next(self) -> Token:
+        ret = self._skip_blanks()
+
+        # comments or directives
+        if ret is not None:
+            return ret
         else:
-            return Token.float(self, float(first + rem))
+            return self._parse(self._skip_char())
 
-    def _parse_number_complex(self, first: str) -> Token:
-        self._next_char()
-        return Token.complex(self, float(first) * 1j)
+    def save_state(self) -> int:
+        return self.pos
 
-    def _parse_number_science(self, first: str) -> Token:
-        ok = False
-        ret = self._next_char()
-        nch = self._peek_char()
+    def load_state(self, state: int):
+        self.pos = state
 
-        # check for exponent sign
-        if nch in ('+', '-'):
-            ret += self._next_char()
-            nch = self._peek_char()
+class BytesTokenizer(Tokenizer):
+    src: Source
 
-        # scan every digit
-        while nch and nch in digits:
-            ret += self._next_char()
-            nch, ok = self._peek_char(), True
+    # bytes version of the patterns
+    scan_binary   = BYTES_BINARY
+    scan_octal    = BYTES_OCTAL
+    scan_hexdec   = BYTES_HEXDEC
+    scan_decimal  = BYTES_DECIMAL
+    scan_operator = BYTES_OPERATOR
 
-        # check for complex numbers
-        if not ok:
-            raise self._error('invalid float literal')
-        elif nch == 'i':
-            return self._parse_number_complex(first + ret)
+    def __init__(self, src: Source, fname: str, lazy: bool = False, comments: bool = True):
+        self.pos = 0
+        self.src = src
+        self.mark = 0
+        self.lazy = lazy
+        self.comments = comments
+
+        # force a new-line after source, this requires a copy
+        # of the source, but it rarely happens with Golang sources
+        if self.src[-1:] != b'\n':
+            self.src = bytes(self.src) + b'\n'
+
+        # offsets are in bytes, while column numbers are still in characters
+        self.lines = BytesLineIndex(self.src, fname)
+
+    @classmethod
+    def open(cls, fname: str, lazy: bool = False, comments: bool = True) -> 'BytesTokenizer':
+        with open(fname, 'rb') as fp:
+            try:
+                src = mmap.mmap(fp.fileno(), 0, access = mmap.ACCESS_READ)
+            except ValueError:
+                src = b''
+
+        # the mapping is still valid after the file is closed
+        return cls(src, fname, lazy, comments)
+
+    def _char(self, pos: int) -> str:
+        return chr(self.src[pos])
+
+    def _find(self, sub: str, pos: int, end: int) -> int:
+        return self.src.find(sub.encode('utf-8'), pos, end)
+
+    def _slice(self, pos: int, end: int) -> str:
+        return self.src[pos:end].decode('utf-8')
+
+    def _bytes(self, pos: int, end: int) -> bytes:
+        return self.src[pos:end]
+
+    def _curr_char(self) -> str:
+        return BYTES_CHARS[self.src[self.pos]]
+
+    def _next_char(self) -> str:
+        if self.is_eof:
+            return ''
+
+        # fast path for ASCII chars
+        pos = self.pos
+        val = self.src[pos]
+
+        # determine the length of UTF-8 sequence by its leading byte
+        if val < 0x80:
+            size = 1
+        elif val < 0xe0:
+            size = 2
+        elif val < 0xf0:
+            size = 3
         else:
-            return Token.float(self, float(first + ret))
+            size = 4
 
-    def _parse_number_charset(self, name: str, base: int, charset: str) -> Token:
-        ret = ''
-        nch = self._peek_char()
+        # advance read pointer
+        self.pos = pos + size
+        return chr(val) if size == 1 else self._slice(pos, pos + size)
 
-        # scan every digit
-        while nch and nch in charset:
-            ret += self._next_char()
-            nch = self._peek_char()
+    def _skip_eol(self) -> str:
+        ret = super()._skip_eol()
+        ret = ret[:-1] if ret.endswith('\r') else ret
+        return ret
 
-        # check for result
-        if not ret or (nch and nch in hexdigits):
-            raise self._error('invalid %s digit' % name)
+    def _skip_space(self):
+        mat = BYTES_BLANKS.match(self.src, self.pos)
+
+        # the pattern also matches the UTF-8 encoded Unicode spaces
+        if mat is not None:
+            self.pos = mat.end()
+
+    def _check_prefix(self, *pfx: str) -> bool:
+        for p in pfx:
+            if self.src[self.pos:self.pos + len(p)] == p.encode('utf-8'):
+                return True
         else:
-            return Token.int(self, int(ret, base))
+            return False
 
-    def _parse_decimal(self) -> Token:
-        if self.is_eof or self._curr_char() not in digits:
-            return self._parse_operator('.')
+    def _parse_raw(self) -> Token:
+        pos = self.pos
+        end = self.src.find(b'`', pos)
+
+        # raw strings never have escape sequences, just reference the source
+        if end < 0:
+            raise self._error('unexpected EOF')
         else:
-            return self._parse_number_float('.')
+            self.pos = end + 1
+            return SliceToken(self, pos, end, raw = True)
 
-    def _parse_operator(self, first: str) -> Token:
-        ops = first
-        node = OPERATORS.children[first]
+    def _parse_string(self) -> Token:
+        pos = self.pos
+        mat = BYTES_STRING.match(self.src, pos)
 
-        # in Golang, the first character of every
-        # multi-char operator is a valid operator by it's own
-        if not node.is_leaf:
-            raise SystemError('invalid operator table')
+        # let the slow path report the error, if any
+        if mat is None:
+            return super()._parse_string()
 
-        # commit the first char
-        ret = ops
-        pst = self.save_state()
-        nch = self._peek_char()
+        # reference the string body directly, decode only when needed
+        self.pos = mat.end()
+        return SliceToken(self, pos, self.pos - 1, raw = False)
 
-        # traverse the trie tree
-        while nch and nch in node:
-            node = node.children[nch]
-            ops += self._next_char()
-            nch = self._peek_char()
+    def _parse_identifier(self, _: str) -> Token:
+        mat = BYTES_IDENTS.match(self.src, self.mark)
+        end = mat.end()
+        ret = self._slice(self.mark, end)
 
-            # commit the current state for leaf nodes
-            if node.is_leaf:
-                ret = ops
-                pst = self.save_state()
+        # non-ASCII chars may not be letters, check again with the Unicode pattern
+        if len(ret) != end - self.mark:
+            ret = SCAN_IDENTS.match(ret).group()
+            end = self.mark + len(ret.encode('utf-8'))
 
         # build the token
-        self.load_state(pst)
-        return Token.operator(self, ret)
+        self.pos = end
+        return Token.ident(self, ret)
 
-    def _parse_identifier(self, first: str) -> Token:
-        ret = first
-        nch = self._peek_char()
+class TokenBuffer:
+    src    : str
+    kinds  : array
+    start  : array
+    end    : array
+    index  : array
+    lines  : LineIndex
+    cache  : Dict[Tuple[int, str], int]
+    values : List[TokenValue]
+    reader : Tokenizer
 
-        # scan until no more identifier characters
-        while nch and IDENT_REMS.match(nch):
-            ret += self._next_char()
-            nch = self._peek_char()
+    __slots__ = (
+        'src',
+        'kinds',
+        'start',
+        'end',
+        'index',
+        'lines',
+        'cache',
+        'values',
+        'reader',
+    )
 
-        # build the token
-        return Token.ident(self, ret)
+    def __init__(self, src: str, fname: str, comments: bool = True):
+        self.cache = {}
+        self.values = []
+        self.kinds = array('B')
+        self.start = array('I')
+        self.end = array('I')
+        self.index = array('i')
+        self.reader = Tokenizer(src, fname, lazy = True, comments = comments)
+
+        # share the source and line index with the reader
+        self.src = self.reader.src
+        self.lines = self.reader.lines
+
+        # lex the whole file
+        while not self.reader.is_eof:
+            self._add(self.reader.next())
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, idx: int) -> Token:
+        return LazyToken(self.start[idx], self.lines, TokenType(self.kinds[idx]), self._value(idx))
+
+    def _add(self, tk: Token):
+        self.kinds.append(tk.kind)
+        self.start.append(self.reader.mark)
+        self.end.append(self.reader.pos)
+
+        # names, keywords and operators are shared in the value table,
+        # literals are decoded again from the source only when needed
+        if tk.kind in (TokenType.Name, TokenType.Keyword, TokenType.Operator):
+            self.index.append(self._intern(tk.kind, tk.value))
+        else:
+            self.index.append(-1)
+
+    def _intern(self, kind: TokenType, value: str) -> int:
+        key = (kind, value)
+        ret = self.cache.get(key)
+
+        # add to value table if not exists
+        if ret is None:
+            ret = self.cache[key] = len(self.values)
+            self.values.append(value)
+
+        # all done
+        return ret
+
+    def _value(self, idx: int) -> TokenValue:
+        vid = self.index[idx]
+        kind = self.kinds[idx]
+
+        # already in the value table, LF and End never have values
+        if vid >= 0:
+            return self.values[vid]
+        elif kind == TokenType.LF or kind == TokenType.End:
+            return None
+
+        # re-read the token from it's start offset, the source has already been
+        # scanned once, so this never fails, and all the line directives are known
+        self.reader.load_state(self.start[idx])
+        val = self.reader.next().value
+
+        # cache the decoded value
+        self.index[idx] = len(self.values)
+        self.values.append(val)
+        return val
+
+    def cursor(self) -> 'TokenCursor':
+        return TokenCursor(self)
+
+class TokenCursor:
+    buf   : TokenBuffer
+    idx   : int
+    mark  : int
+    lazy  : bool
+    lines : LineIndex
+
+    __slots__ = (
+        'buf',
+        'idx',
+        'mark',
+        'lazy',
+        'lines',
+    )
+
+    def __init__(self, buf: TokenBuffer):
+        self.buf = buf
+        self.idx = 0
+        self.mark = 0
+        self.lazy = True
+        self.lines = buf.lines
 
     @property
-    def is_eof(self):
-        return self.state.pos >= len(self.src)
+    def file(self) -> str:
+        return self.lines.locate(self.mark)[2]
+
+    @property
+    def is_eof(self) -> bool:
+        return self.idx >= len(self.buf)
 
     def next(self) -> Token:
-        try:
-            nch = self._skip_blanks()
-        except _GotComments as e:
-            return Token.comments(self, e.text)
-        except _GotDirective as e:
-            return Token.directive(self, e.pragma)
-        else:
-            return self._parse(nch)
+        idx = self.idx
+        buf = self.buf
+
+        # no more tokens, the End token is located at the end of source
+        if idx >= len(buf):
+            self.mark = len(buf.src)
+            return Token.end(self)
+
+        # move to the next token
+        self.idx = idx + 1
+        self.mark = buf.start[idx]
+        return buf[idx]
+
+    def save_state(self) -> int:
+        return self.idx
+
+    def load_state(self, state: int):
+        self.idx = state
+
+# token types by their values, this is way faster than calling `TokenType`
+TOKEN_TYPES = {v.value: v for v in TokenType}
+
+class TokenArray:
+    rows   : array
+    cols   : array
+    fids   : array
+    kinds  : array
+    files  : List[str]
+    values : List[TokenValue]
+    index  : List[int]
+    cache  : List[Optional[Token]]
+
+    __slots__ = (
+        'rows',
+        'cols',
+        'fids',
+        'kinds',
+        'files',
+        'values',
+        'index',
+        'cache',
+    )
+
+    # number of token objects that are kept around, must be a power of 2
+    WINDOW = 64
+
+    def __init__(self):
+        self.rows = array('I')
+        self.cols = array('I')
+        self.fids = array('I')
+        self.kinds = array('B')
+        self.files = []
+        self.values = []
+        self.index = [-1] * self.WINDOW
+        self.cache = [None] * self.WINDOW
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, idx: int) -> Token:
+        slot = idx & (self.WINDOW - 1)
+
+        # only the recently used tokens are kept as objects, backtracking rarely goes further than that
+        if self.index[slot] == idx:
+            return self.cache[slot]
+
+        # rebuild the token from the columns
+        tk = self.cache[slot] = Token(self.cols[idx], self.rows[idx], self.files[self.fids[idx]], TOKEN_TYPES[self.kinds[idx]], self.values[idx])
+        self.index[slot] = idx
+        return tk
+
+    def __getstate__(self) -> tuple:
+        return self.rows, self.cols, self.fids, self.kinds, self.files, self.values
+
+    def __setstate__(self, state: tuple):
+        self.rows, self.cols, self.fids, self.kinds, self.files, self.values = state
+        self.index = [-1] * self.WINDOW
+        self.cache = [None] * self.WINDOW
+
+    def append(self, tk: Token):
+        idx = len(self.kinds)
+        slot = idx & (self.WINDOW - 1)
+        fname = tk.file
+
+        # file names only change with line directives
+        if not self.files or self.files[-1] != fname:
+            self.files.append(fname)
+
+        # the token object is most likely to be read again very soon
+        self.index[slot] = idx
+        self.cache[slot] = tk
+
+        # add the token
+        self.rows.append(tk.row)
+        self.cols.append(tk.col)
+        self.fids.append(len(self.files) - 1)
+        self.kinds.append(tk.kind)
+        self.values.append(tk.value)
+
+    def slice(self, beg: int, end: int) -> 'TokenArray':
+        ret = TokenArray()
+        ret.rows = self.rows[beg:end]
+        ret.cols = self.cols[beg:end]
+        ret.fids = self.fids[beg:end]
+        ret.kinds = self.kinds[beg:end]
+        ret.files = self.files
+        ret.values = self.values[beg:end]
+        return ret
+
+class TokenReplay:
+    buf : TokenArray
+    idx : int
+
+    __slots__ = (
+        'buf',
+        'idx',
+    )
+
+    def __init__(self, buf: TokenArray):
+        self.buf = buf
+        self.idx = 0
+
+    @property
+    def is_eof(self) -> bool:
+        return self.idx >= len(self.buf)
+
+    def next(self) -> Token:
+        idx = self.idx
+        buf = self.buf
 
-    def save_state(self) -> State:
-        return self.state.copy()
+        # the End token is located at the last token
+        if idx >= len(buf):
+            tk = buf[len(buf) - 1]
+            return Token(tk.col, tk.row, tk.file, TokenType.End, None)
 
-    def load_state(self, state: State):
-        self.state = state.copy()
+        # move to the next token
+        self.idx = idx + 1
+        return buf[idx]
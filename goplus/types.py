@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+
 from enum import IntEnum
 
+from typing import Any
 from typing import cast
+from typing import Dict
+from typing import Set
 from typing import List
+from typing import Tuple
 from typing import Optional
-from typing import FrozenSet
 
 from .utils import StrictFields
 from .flags import ChannelOptions
@@ -41,23 +46,55 @@ class Kind(IntEnum):
     UnsafePointer = 26
     Named         = 255
 
+MethodMap = Dict[
+    str,
+    'Method',
+]
+
 class Type(metaclass = StrictFields):
     kind   : Kind
     valid  : bool
     tfuncs : List['Method']
     pfuncs : List['Method']
+    fp_    : Optional[str]
+    sig_   : Optional[str]
+    repr_  : Optional[str]
+    mset_  : Optional['MethodSet']
+    pset_  : Optional['MethodSet']
+    canon_ : bool
 
     __noinit__ = {
         'kind',
         'valid',
     }
 
+    __transient__ = {
+        'fp_',
+        'sig_',
+        'repr_',
+        'mset_',
+        'pset_',
+        'canon_',
+    }
+
     def __init__(self, kind: Kind, valid: bool = True):
         self.kind = kind
         self.valid = valid
 
     def __repr__(self) -> str:
-        return self._to_repr(frozenset())
+        if self.repr_ is not None:
+            return self.repr_
+
+        # walk the type graph
+        path = ReprPath()
+        ret = self._to_repr(path)
+
+        # only cache it when none of the types could change anymore
+        if path.settled:
+            self.repr_ = ret
+
+        # all done
+        return ret
 
     def __hash__(self) -> int:
         return self.kind.value
@@ -73,15 +110,113 @@ class Type(metaclass = StrictFields):
                self.tfuncs == other.tfuncs and \
                self.pfuncs == other.pfuncs
 
-    def _to_repr(self, _path: FrozenSet['Type']) -> str:
-        if id(self) in _path:
+    def _to_repr(self, _path: 'ReprPath') -> str:
+        if id(self) in _path.ids:
             return '...'
-        else:
-            return self._get_repr(_path | {id(self)})
 
-    def _get_repr(self, _path: FrozenSet['Type']) -> str:
+        # check if this type could still change
+        if not self._is_settled():
+            _path.settled = False
+
+        # types on the current path are tracked in place, rather than
+        # building a new set for every level
+        try:
+            _path.ids.add(id(self))
+            return self._get_repr(_path)
+        finally:
+            _path.ids.remove(id(self))
+
+    def _get_repr(self, _path: 'ReprPath') -> str:
         return self.kind.name.lower()
 
+    def _get_sig(self) -> str:
+        return self.kind.name.lower()
+
+    def _is_settled(self) -> bool:
+        return True
+
+    def _components(self) -> List[Optional['Type']]:
+        return []
+
+    def _invalidate(self):
+        self.fp_ = None
+        self.sig_ = None
+        self.repr_ = None
+
+    @property
+    def signature(self) -> str:
+        """
+        Canonical string of the type structure. Named types are represented by
+        their qualified names, so it is always finite, even for recursive types.
+        """
+
+        # already computed
+        if self.sig_ is not None:
+            return self.sig_
+
+        # computing it also caches the signatures of the components, if possible
+        ret = self._get_sig()
+        comp = self._components()
+
+        # only cache it when neither this type nor any of the components could change anymore
+        if self._is_settled() and all(v is not None and v.sig_ is not None for v in comp):
+            self.sig_ = ret
+
+        # all done
+        return ret
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Short digest of the type signature. It is only stable across processes when
+        every named type involved belongs to a package, local named types are told
+        apart by a process-local serial number.
+        """
+
+        # already computed
+        if self.fp_ is not None:
+            return self.fp_
+
+        # digest the signature, cache it along with the signature
+        sig = self.signature
+        ret = hashlib.sha1(sig.encode('utf-8')).hexdigest()[:16]
+
+        # the signature might not be cacheable yet
+        if self.sig_ is not None:
+            self.fp_ = ret
+
+        # all done
+        return ret
+
+    def _intern_key(self) -> Optional[Tuple[Any, ...]]:
+        return None
+
+    def _method_set(self, ptr: bool) -> MethodMap:
+        mset = self.pset_ if ptr else self.mset_
+
+        # method sets are valid until any of the types they come from gets a new method
+        if mset is not None and mset.stamp.valid():
+            return mset.funcs
+
+        # build the method set
+        mset = MethodSet(MethodStamp(self), _build_method_set(self, ptr))
+
+        # cache the result
+        if ptr:
+            self.pset_ = mset
+        else:
+            self.mset_ = mset
+
+        # all done
+        return mset.funcs
+
+    def methods(self) -> MethodMap:
+        return self._method_set(False)
+
+    def add_method(self, method: 'Method', ptr: bool = False):
+        self._invalidate()
+        (self.pfuncs if ptr else self.tfuncs).append(method)
+
 class Method(metaclass = StrictFields):
     name: str
     type: 'FuncType'
@@ -93,6 +228,83 @@ class Method(metaclass = StrictFields):
     def __eq__(self, val: 'Method') -> bool:
         return self.name == val.name and self.type == val.type
 
+def _sig_of(vt: Optional[Type]) -> str:
+    if vt is None:
+        return '?'
+    else:
+        return vt.signature
+
+def _sig_of_func(vt: 'FuncType') -> str:
+    args = [_sig_of(v) for v in vt.args]
+    rets = [_sig_of(v) for v in vt.rets]
+
+    # variadic functions
+    if vt.var and args:
+        args[-1] = '...' + args[-1]
+
+    # function options, if any
+    if not vt.flags:
+        flags = ''
+    else:
+        flags = ' /* %d */' % vt.flags
+
+    # single return value does not need parentheses
+    if len(rets) == 1:
+        return '(%s) %s%s' % (', '.join(args), rets[0], flags)
+    elif rets:
+        return '(%s) (%s)%s' % (', '.join(args), ', '.join(rets), flags)
+    else:
+        return '(%s)%s' % (', '.join(args), flags)
+
+class ReprPath(metaclass = StrictFields):
+    ids     : Set[int]
+    settled : bool
+
+    def __init__(self):
+        self.ids = set()
+        self.settled = True
+
+class MethodStamp(metaclass = StrictFields):
+    deps: List[Tuple['Type', int]]
+
+    def __init__(self, *types: 'Type'):
+        seen = set()
+        stack = list(types)
+
+        # find every type that could contribute methods to the method sets of
+        # these types (or pointers to them), through the underlying types,
+        # pointer base types and embedded fields
+        while stack:
+            vt = stack.pop()
+            rt = _underlying(vt)
+
+            # every type is recorded at most once
+            if vt is None or id(vt) in seen:
+                continue
+
+            # methods are only ever appended, so the counts tell if anything has changed
+            seen.add(id(vt))
+            self.deps.append((vt, len(vt.tfuncs) + len(vt.pfuncs)))
+
+            # search the related types
+            if rt is not vt:
+                stack.append(rt)
+            elif isinstance(rt, PtrType):
+                stack.append(rt.elem)
+            elif isinstance(rt, StructType):
+                stack.extend(v.type for v in rt.fields if v.embed)
+
+    def valid(self) -> bool:
+        return all(len(vt.tfuncs) + len(vt.pfuncs) == n for vt, n in self.deps)
+
+class MethodSet(metaclass = StrictFields):
+    stamp : MethodStamp
+    funcs : MethodMap
+
+    def __init__(self, stamp: MethodStamp, funcs: MethodMap):
+        self.stamp = stamp
+        self.funcs = funcs
+
 class PtrType(Type):
     elem: Optional[Type]
 
@@ -100,17 +312,35 @@ class PtrType(Type):
         self.elem = elem
         super().__init__(Kind.Ptr)
 
+    def methods(self) -> MethodMap:
+        if self.elem is None:
+            return {}
+        else:
+            return self.elem._method_set(True)
+
     def __hash__(self) -> int:
-        return hash(self.elem)
+        return hash((self.kind, self.elem))
 
     def __eq__(self, val: 'Type') -> bool:
-        return super().__eq__(val) and \
+        return self is val or super().__eq__(val) and \
                isinstance(val, PtrType) and \
                self.elem == cast(PtrType, val).elem
 
-    def _get_repr(self, _path: FrozenSet[Type]) -> str:
+    def _get_repr(self, _path: 'ReprPath') -> str:
         return '*%s' % self.elem._to_repr(_path)
 
+    def _get_sig(self) -> str:
+        return '*%s' % _sig_of(self.elem)
+
+    def _intern_key(self) -> Optional[Tuple[Any, ...]]:
+        return self.elem and (Kind.Ptr, id(self.elem))
+
+    def _is_settled(self) -> bool:
+        return self.canon_
+
+    def _components(self) -> List[Optional[Type]]:
+        return [self.elem]
+
 class MapType(Type):
     key  : Optional[Type]
     elem : Optional[Type]
@@ -124,17 +354,29 @@ class MapType(Type):
         return hash((self.key, self.elem))
 
     def __eq__(self, val: 'Type') -> bool:
-        return super().__eq__(val) and \
+        return self is val or super().__eq__(val) and \
                isinstance(val, MapType) and \
                self.key == cast(MapType, val).key and \
                self.elem == cast(MapType, val).elem
 
-    def _get_repr(self, _path: FrozenSet[Type]) -> str:
+    def _get_repr(self, _path: 'ReprPath') -> str:
         return 'map[%s]%s' % (
             self.key._to_repr(_path),
             self.elem._to_repr(_path),
         )
 
+    def _get_sig(self) -> str:
+        return 'map[%s]%s' % (_sig_of(self.key), _sig_of(self.elem))
+
+    def _intern_key(self) -> Optional[Tuple[Any, ...]]:
+        return self.key and self.elem and (Kind.Map, id(self.key), id(self.elem))
+
+    def _is_settled(self) -> bool:
+        return self.canon_
+
+    def _components(self) -> List[Optional[Type]]:
+        return [self.key, self.elem]
+
 class FuncType(Type):
     var   : bool
     args  : List[Type]
@@ -146,16 +388,34 @@ class FuncType(Type):
         super().__init__(Kind.Func)
 
     def __hash__(self) -> int:
-        return hash((self.var, self.flags))
+        return hash((self.var, self.flags, tuple(self.args), tuple(self.rets)))
 
     def __eq__(self, val: 'Type') -> bool:
-        return super().__eq__(val) and \
+        return self is val or super().__eq__(val) and \
                isinstance(val, FuncType) and \
                self.var == cast(FuncType, val).var and \
                self.args == cast(FuncType, val).args and \
                self.rets == cast(FuncType, val).rets and \
                self.flags == cast(FuncType, val).flags
 
+    def _get_sig(self) -> str:
+        return 'func' + _sig_of_func(self)
+
+    def _intern_key(self) -> Optional[Tuple[Any, ...]]:
+        return (
+            Kind.Func,
+            self.var,
+            self.flags,
+            tuple(map(id, self.args)),
+            tuple(map(id, self.rets)),
+        )
+
+    def _is_settled(self) -> bool:
+        return self.canon_
+
+    def _components(self) -> List[Optional[Type]]:
+        return self.args + self.rets
+
 class ChanType(Type):
     dir  : ChannelOptions
     elem : Optional[Type]
@@ -175,17 +435,29 @@ class ChanType(Type):
         return hash((self.dir, self.elem))
 
     def __eq__(self, val: 'Type') -> bool:
-        return super().__eq__(val) and \
+        return self is val or super().__eq__(val) and \
                isinstance(val, ChanType) and \
                self.dir == cast(ChanType, val).dir and \
                self.elem == cast(ChanType, val).elem
 
-    def _get_repr(self, _path: FrozenSet[Type]) -> str:
+    def _get_repr(self, _path: 'ReprPath') -> str:
         return '%s %s' % (
             self.__chan_type__[self.dir],
             self.elem._to_repr(_path),
         )
 
+    def _get_sig(self) -> str:
+        return '%s %s' % (self.__chan_type__[self.dir], _sig_of(self.elem))
+
+    def _intern_key(self) -> Optional[Tuple[Any, ...]]:
+        return self.elem and (Kind.Chan, self.dir, id(self.elem))
+
+    def _is_settled(self) -> bool:
+        return self.canon_
+
+    def _components(self) -> List[Optional[Type]]:
+        return [self.elem]
+
 class ArrayType(Type):
     len  : Optional[int]
     elem : Optional[Type]
@@ -198,17 +470,35 @@ class ArrayType(Type):
         return hash((self.len, self.elem))
 
     def __eq__(self, val: 'Type') -> bool:
-        return super().__eq__(val) and \
+        return self is val or super().__eq__(val) and \
                isinstance(val, ArrayType) and \
                self.len == cast(ArrayType, val).len and \
                self.elem == cast(ArrayType, val).elem
 
-    def _get_repr(self, _path: FrozenSet[Type]) -> str:
+    def _get_repr(self, _path: 'ReprPath') -> str:
         if self.len is None:
             return '[?]%s' % self.elem._to_repr(_path)
         else:
             return '[%d]%s' % (self.len, self.elem._to_repr(_path))
 
+    def _get_sig(self) -> str:
+        if self.len is None:
+            return '[?]%s' % _sig_of(self.elem)
+        else:
+            return '[%d]%s' % (self.len, _sig_of(self.elem))
+
+    def _intern_key(self) -> Optional[Tuple[Any, ...]]:
+        if self.len is None:
+            return None
+        else:
+            return self.valid and self.elem and (Kind.Array, self.len, id(self.elem)) or None
+
+    def _is_settled(self) -> bool:
+        return self.canon_
+
+    def _components(self) -> List[Optional[Type]]:
+        return [self.elem]
+
 class SliceType(Type):
     elem: Optional[Type]
 
@@ -217,27 +507,54 @@ class SliceType(Type):
         super().__init__(Kind.Slice)
 
     def __hash__(self) -> int:
-        return hash(self.elem)
+        return hash((self.kind, self.elem))
 
     def __eq__(self, val: 'Type') -> bool:
-        return super().__eq__(val) and \
+        return self is val or super().__eq__(val) and \
                isinstance(val, SliceType) and \
                self.elem == cast(SliceType, val).elem
 
-    def _get_repr(self, _path: FrozenSet[Type]) -> str:
+    def _get_repr(self, _path: 'ReprPath') -> str:
         return '[]%s' % self.elem._to_repr(_path)
 
+    def _get_sig(self) -> str:
+        return '[]%s' % _sig_of(self.elem)
+
+    def _intern_key(self) -> Optional[Tuple[Any, ...]]:
+        return self.elem and (Kind.Slice, id(self.elem))
+
+    def _is_settled(self) -> bool:
+        return self.canon_
+
+    def _components(self) -> List[Optional[Type]]:
+        return [self.elem]
+
 class StructType(Type):
     fields: List['StructField']
 
     def __init__(self):
         super().__init__(Kind.Struct, False)
 
+    def __hash__(self) -> int:
+        return hash((self.kind, tuple((v.name, v.type) for v in self.fields)))
+
     def __eq__(self, val: 'Type') -> bool:
-        return super().__eq__(val) and \
+        return self is val or super().__eq__(val) and \
                isinstance(val, StructType) and \
                self.fields == cast(StructType, val).fields
 
+    def _get_sig(self) -> str:
+        return 'struct {%s}' % '; '.join(map(_sig_of_field, self.fields))
+
+    def _intern_key(self) -> Optional[Tuple[Any, ...]]:
+        return self.valid and (Kind.Struct, tuple((v.name, id(v.type), v.tags, v.embed) for v in self.fields)) or None
+
+    def _is_settled(self) -> bool:
+        return self.canon_
+
+    def _components(self) -> List[Optional[Type]]:
+        return [v.type for v in self.fields]
+
 class StructField(metaclass = StrictFields):
     name  : str
     type  : Type
@@ -250,27 +567,59 @@ class StructField(metaclass = StrictFields):
                self.tags == val.tags and \
                self.embed == val.embed
 
+def _sig_of_field(field: StructField) -> str:
+    if field.embed:
+        ret = _sig_of(field.type)
+    else:
+        ret = '%s %s' % (field.name, _sig_of(field.type))
+
+    # struct tags are part of the type identity
+    if field.tags is None:
+        return ret
+    else:
+        return '%s %r' % (ret, field.tags)
+
 class InterfaceType(Type):
     def __init__(self):
         super().__init__(Kind.Interface)
 
-class NamedType(Type):
-    name: str
-    type: Optional[Type]
+    def __hash__(self) -> int:
+        return hash((self.kind, tuple(v.name for v in self.tfuncs)))
+
+    def _get_sig(self) -> str:
+        return 'interface {%s}' % '; '.join(sorted(v.name + _sig_of_func(v.type) for v in self.tfuncs))
+
+    def _intern_key(self) -> Optional[Tuple[Any, ...]]:
+        return Kind.Interface, tuple(sorted((v.name, id(v.type)) for v in self.tfuncs))
 
-    def __init__(self, name: str, rtype: Optional[Type] = None):
+    def _is_settled(self) -> bool:
+        return self.canon_
+
+    def _components(self) -> List[Optional[Type]]:
+        return [v.type for v in self.tfuncs]
+
+class NamedType(Type):
+    uid  : int
+    pkg  : Optional[str]
+    name : str
+    type : Optional[Type]
+
+    # serial number of named types, used to tell local types apart
+    serial = 0
+
+    def __init__(self, name: str, rtype: Optional[Type] = None, pkg: Optional[str] = None):
+        NamedType.serial += 1
+        self.uid = NamedType.serial
+        self.pkg = pkg
         self.name = name
         self.type = rtype
         super().__init__(Kind.Named, False)
 
     def __hash__(self) -> int:
-        return hash(self.type)
+        return id(self)
 
     def __eq__(self, val: 'Type') -> bool:
-        if not isinstance(val, NamedType):
-            return self.type is val
-        else:
-            return self.type is val.type
+        return self is val
 
     @property
     def kind(self) -> Kind:
@@ -289,9 +638,18 @@ class NamedType(Type):
     kind  = kind.setter(lambda *_: None)
     valid = valid.setter(lambda *_: None)
 
-    def _get_repr(self, _path: FrozenSet[Type]) -> str:
+    def _get_repr(self, _path: 'ReprPath') -> str:
         return '%s(%s)' % (self.name, self.type._get_repr(_path))
 
+    def _get_sig(self) -> str:
+        if self.pkg is None:
+            return '%s#%d' % (self.name, self.uid)
+        else:
+            return '%s.%s' % (self.pkg, self.name)
+
+    def _is_settled(self) -> bool:
+        return self.type is not None and self.type._is_settled()
+
 class UntypedType(Type):
     def __eq__(self, other: 'Type') -> bool:
         return super().__eq__(other) and isinstance(other, UntypedType)
@@ -299,9 +657,118 @@ class UntypedType(Type):
     def __hash__(self) -> int:
         return super().__hash__()
 
-    def _get_repr(self, _path: FrozenSet[Type]) -> str:
+    def _get_repr(self, _path: 'ReprPath') -> str:
         return 'untyped %s' % super()._get_repr(_path)
 
+    def _get_sig(self) -> str:
+        return 'untyped %s' % super()._get_sig()
+
+def _underlying(vt: Optional[Type]) -> Optional[Type]:
+    while isinstance(vt, NamedType):
+        vt = vt.type
+    else:
+        return vt
+
+def _build_method_set(vt: Type, ptr: bool) -> MethodMap:
+    """
+    Method set of a type, refs from https://golang.org/ref/spec#Method_sets
+
+    The method set of any other type T consists of all methods declared with
+    receiver type T. The method set of the corresponding pointer type *T is
+    the set of all methods declared with receiver *T or T (that is, it also
+    contains the method set of T). Further rules apply to structs containing
+    embedded fields, as described in the section on struct types.
+    """
+
+    ret = {}
+    seen = set()
+    level = [(vt, ptr)]
+
+    # pointers to pointers or interfaces have no methods
+    if ptr and isinstance(_underlying(vt), (PtrType, InterfaceType)):
+        return {}
+
+    # search the embedded types level by level, shallower ones shadow deeper ones
+    while level:
+        names = {}
+        embeds = []
+
+        # methods and fields of this level
+        for vtype, isptr in level:
+            rtype = _underlying(vtype)
+            funcs = vtype.tfuncs
+
+            # every type is searched at most once
+            if (id(vtype), isptr) in seen:
+                continue
+
+            # methods with pointer receivers
+            seen.add((id(vtype), isptr))
+            funcs = funcs + vtype.pfuncs if isptr else funcs
+
+            # interfaces have methods in their underlying types
+            if isinstance(rtype, InterfaceType) and rtype is not vtype:
+                funcs = funcs + rtype.tfuncs
+
+            # names at the same depth are ambiguous, which is marked as None
+            for func in funcs:
+                names[func.name] = None if func.name in names else func
+
+            # fields block methods with the same name from deeper levels
+            if isinstance(rtype, StructType):
+                for field in rtype.fields:
+                    names[field.name] = None
+
+                    # promoted methods of the embedded fields
+                    if field.embed:
+                        if isinstance(field.type, PtrType):
+                            embeds.append((field.type.elem, True))
+                        else:
+                            embeds.append((field.type, isptr))
+
+        # names of this level shadow the deeper ones
+        for name, func in names.items():
+            ret.setdefault(name, func)
+
+        # search the next level
+        level = embeds
+
+    # sort by name, and remove fields and ambiguous names
+    return {
+        name: ret[name]
+        for name in sorted(ret)
+        if ret[name] is not None
+    }
+
+class TypeTable:
+    types: Dict[Tuple[Any, ...], Type]
+
+    def __init__(self):
+        self.types = {}
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def intern(self, vt: Type) -> Type:
+        """
+        Returns the canonical instance of a composite type. Components are keyed
+        by their identities, so canonical components give canonical results.
+        Named types, basic types and incomplete types are returned as-is.
+        Canonical instances must not be modified anymore.
+        """
+
+        # types with methods are never shared, except interfaces
+        if vt.pfuncs or vt.tfuncs and not isinstance(vt, InterfaceType):
+            return vt
+
+        # check for the intern key
+        key = vt._intern_key()
+        ret = vt if key is None else self.types.setdefault(key, vt)
+
+        # signatures of canonical types can be cached safely
+        ret.canon_ = key is not None
+        return ret
+
 class Types:
     Nil            = Type(Kind.Nil)
     Bool           = Type(Kind.Bool)
@@ -12,16 +12,54 @@ from typing import Callable
 from typing import Optional
 
 from types import FunctionType
+from types import MemberDescriptorType
 from bytecode import CompilerFlags
 
 from .assembler import Assembler
 
+FIELDS = {}
+
 class StrictFields(type):
     def __new__(mcs, name: str, bases: Tuple[Type], ns: Dict[str, Any]) -> type:
         noinit = ns.pop('__noinit__', set())
         typing = ns.get('__annotations__', {})
+
+        # root classes can be pickled with only the field values
+        if not bases:
+            ns.setdefault('__getstate__', _get_state)
+            ns.setdefault('__setstate__', _set_state)
+
+        # build the class
         return super().__new__(mcs, name, bases, _build_attrs(ns, bases, typing, noinit))
 
+def _fields_of(cls: type) -> Tuple[str, ...]:
+    ret = FIELDS.get(cls)
+
+    # slots shadowed by class attributes (such as "kind" of values) are not real fields,
+    # transient fields (such as caches) are not part of the state either
+    if ret is None:
+        ret = FIELDS[cls] = tuple(
+            name
+            for base in cls.__mro__
+            for name in base.__dict__.get('__slots__', ())
+            if isinstance(getattr(cls, name, None), MemberDescriptorType)
+            and name not in getattr(cls, '__transient__', ())
+        )
+
+    # all done
+    return ret
+
+def _get_state(self: Any) -> Tuple[Any, ...]:
+    return tuple(getattr(self, key, None) for key in _fields_of(self.__class__))
+
+def _set_state(self: Any, state: Tuple[Any, ...]):
+    for key in getattr(self, '__transient__', ()):
+        setattr(self, key, None)
+
+    # restore all the fields
+    for key, val in zip(_fields_of(self.__class__), state):
+        setattr(self, key, val)
+
 # this differs between implementations
 if platform.python_implementation() == 'PyPy':
     def _real_type(vtype: Any) -> type:
@@ -2,11 +2,34 @@
 # -*- coding: utf-8 -*-
 
 import os
+import zlib
+import shutil
+import tempfile
 import unittest
 
+from typing import Dict
+
 from goplus.inferrer import Mode
 from goplus.inferrer import Inferrer
 
+from goplus.cache import AstCache
+from goplus.cache import ExportCache
+from goplus.cache import MemoryAstCache
+from goplus.symbol import Symbols
+from goplus.symbol import PackageScope
+
+from goplus.types import Types
+from goplus.types import Method
+from goplus.types import MapType
+from goplus.types import PtrType
+from goplus.types import FuncType
+from goplus.types import NamedType
+from goplus.types import SliceType
+from goplus.types import TypeTable
+from goplus.types import StructType
+from goplus.types import StructField
+from goplus.types import InterfaceType
+
 GOROOT = os.environ.get('GOROOT', '')
 GOPATH = os.environ.get('GOPATH', '').split(os.path.pathsep)
 
@@ -20,11 +43,394 @@ print('GOPATH :', GOPATH)
 print('GOPKG  :', GOPKG)
 print('GOPROJ :', GOPROJ)
 
+def write_tree(root: str, files: Dict[str, str]):
+    for name, src in files.items():
+        fname = os.path.join(root, name)
+        os.makedirs(os.path.dirname(fname), exist_ok = True)
+        with open(fname, 'w') as fp:
+            fp.write(src)
+
+def make_inferrer(root: str, mode: Mode = Mode.GO_VENDOR, exps: bool = False) -> Inferrer:
+    ifr = Inferrer('linux', 'amd64', root, root, [root])
+    ifr.mode = mode
+
+    # export data cache replaces the in-memory package cache
+    if exps:
+        ifr.exps = ExportCache(os.path.join(root, 'cache'))
+        ifr.pkgs = None
+
+    # all done
+    return ifr
+
+def import_of(pkg: PackageScope, name: str) -> PackageScope:
+    return next(scope.resolve(name) for scope in pkg.private.values())
+
 class TestInferrer(unittest.TestCase):
+    def make_tree(self, files: Dict[str, str]) -> str:
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        write_tree(root, files)
+        return root
+
     def test_inferrer(self):
         ifr = Inferrer('darwin', 'amd64', GOPROJ, GOROOT, GOPATH)
         ifr.mode = Mode.GO_MOD if USE_MOD else Mode.GO_VENDOR
         ifr.infer(GOPKG)
 
+    def test_build_tags(self):
+        root = self.make_tree({})
+        ifr = make_inferrer(root)
+        for line, target, exp in (
+            ('+build linux,!cgo darwin'  , ('linux', 'ppc64', [])   , True),
+            ('+build linux,!cgo darwin'  , ('linux', 'amd64', [])   , False),
+            ('+build linux,!cgo darwin'  , ('darwin', 'amd64', [])  , True),
+            ('+build !windows !plan9'    , ('windows', 'amd64', []) , True),
+            ('+build'                    , ('linux', 'amd64', [])   , False),
+        ):
+            write_tree(root, {
+                'src/p/a.go' : 'package p\nconst M = 0\n',
+                'src/p/b.go' : '// %s\n\npackage p\nconst N = 1\n' % line,
+            })
+            pkg, = ifr.infer_targets('p', [target])
+            self.assertEqual(exp, 'N' in pkg.public, line)
+
+    def test_dot_import(self):
+        pkg = PackageScope('p', 'example.com/p')
+        dot = PackageScope('a', 'example.com/a')
+        dot.public['Max'] = PackageScope('b', 'example.com/b')
+        syms = pkg.source('p.go')
+        self.assertIsNone(syms.include(dot))
+        self.assertIs(dot.public['Max'], syms.resolve('Max'))
+        self.assertIs(dot.public['Max'], syms.derive().resolve('Max'))
+        self.assertFalse(syms.declare('Max', pkg))
+        self.assertEqual('Max', syms.include(dot))
+
+    def test_block_scope_bind(self):
+        pkg = PackageScope('p', 'example.com/p')
+        pkg.declare('V', Symbols.Var('V', Types.Int))
+        outer = pkg.source('p.go')
+        outer.declare('x', Symbols.Var('x', Types.Int))
+        inner = outer.derive()
+        inner.declare('x', Symbols.Var('x', Types.String))
+        inner.declare('y', Symbols.Var('y', Types.Bool))
+        for scope in (outer, inner):
+            for name in ('x', 'y', 'V', 'int', 'z'):
+                bind = scope.bind(name)
+                self.assertIs(scope.resolve(name), bind and scope.load(bind))
+        bind = inner.derive().bind('y')
+        self.assertEqual((1, 1), (bind.depth, bind.slot))
+        bind = outer.bind('x')
+        self.assertEqual((0, 0), (bind.depth, bind.slot))
+        self.assertIs(pkg.public['V'], inner.bind('V').symbol)
+        shadow = inner.resolve('x')
+        self.assertIs(Types.String, inner.derive().resolve('x').type)
+        outer.declare('y', Symbols.Var('y', Types.Int))
+        pkg.declare('x', Symbols.Var('x', Types.Bool))
+        self.assertIs(shadow, inner.derive().resolve('x'))
+        self.assertIs(Types.Bool, inner.resolve('y').type)
+        self.assertIs(Types.Int, outer.resolve('y').type)
+        self.assertIs(Types.Int, outer.resolve('x').type)
+
+    def test_dot_import_export(self):
+        root = self.make_tree({
+            'src/a/a.go' : 'package a\nconst Y = 5\n',
+            'src/d/d.go' : 'package d\nimport . "a"\nconst V = Y + 47\n',
+            'src/m/m.go' : 'package m\nimport "d"\nconst Z = d.V\n',
+        })
+        digests = set()
+        for _ in range(2):
+            pkg = make_inferrer(root, exps = True).infer('m')
+            self.assertEqual(52, pkg.public['Z'].value)
+            self.assertIsNotNone(import_of(pkg, 'd').digest)
+            digests.add(import_of(pkg, 'd').digest)
+        self.assertEqual(1, len(digests))
+
+    def test_export_invalidate(self):
+        root = self.make_tree({
+            'src/a/a.go' : 'package a\nconst Y = 5\n',
+            'src/d/d.go' : 'package d\nimport . "a"\nconst V = Y + 47\n',
+            'src/e/e.go' : 'package e\nimport "d"\nconst M = d.V * 100\n',
+            'src/m/m.go' : 'package m\nimport "e"\nconst Z = e.M\n',
+        })
+        for val, exp in ((5, 5200), (5000, 504700), (5, 5200)):
+            write_tree(root, {'src/a/a.go': 'package a\nconst Y = %d\n' % val})
+            ifr = make_inferrer(root, exps = True)
+            self.assertEqual(exp, ifr.infer('m').public['Z'].value)
+
+    def test_export_no_digest(self):
+        root = self.make_tree({
+            'src/a/a.go' : 'package a\nconst Y = 5\n',
+            'src/e/e.go' : 'package e\nimport "a"\nconst M = a.Y * 100\n',
+            'src/m/m.go' : 'package m\nimport "e"\nconst Z = e.M\n',
+            'src/n/n.go' : 'package n\nimport "m"\nconst W = m.Z + 1\n',
+        })
+        ifr = make_inferrer(root)
+        ifr.infer('e')
+        pkgs = ifr.pkgs
+        ifr = make_inferrer(root, exps = True)
+        ifr.pkgs = pkgs
+        pkg = ifr.infer('n')
+        self.assertEqual(501, pkg.public['W'].value)
+        self.assertIsNone(import_of(import_of(pkg, 'm'), 'e').digest)
+        self.assertIsNone(import_of(pkg, 'm').digest)
+
+    def test_shared_resolution(self):
+        root = self.make_tree({
+            'src/x/go.mod' : 'module x\n\ngo 1.13\n',
+            'src/x/a/a.go' : 'package a\nconst Y = 5\n',
+            'src/x/b/b.go' : 'package b\nimport "x/a"\nconst V = a.Y + 47\n',
+            'src/x/c/c.go' : 'package c\nimport "x/a"\nimport "x/b"\nconst Z = a.Y * b.V\n',
+        })
+        pkgs = dict(make_inferrer(root, Mode.GO_MOD).infer_all(['x/...']))
+        self.assertEqual(260, pkgs['x/c'].public['Z'].value)
+        self.assertIs(pkgs['x/a'], import_of(pkgs['x/b'], 'a'))
+        self.assertIs(pkgs['x/a'], import_of(pkgs['x/c'], 'a'))
+        self.assertIs(pkgs['x/b'], import_of(pkgs['x/c'], 'b'))
+
+    def test_module_cache(self):
+        root = self.make_tree({
+            'src/x/go.mod'                       : 'module x\n\ngo 1.13\n\nrequire example.com/v v1.0.0\n',
+            'src/x/b/b.go'                       : 'package b\nimport "example.com/v"\nconst V = v.N\n',
+            'pkg/mod/example.com/v@v1.0.0/v.go'  : 'package v\nconst N = 1\n',
+            'pkg/mod/example.com/v@v1.10.0/v.go' : 'package v\nconst N = 2\n',
+        })
+        ifr = make_inferrer(root, Mode.GO_MOD)
+        self.assertEqual(1, ifr.infer('x/b').public['V'].value)
+        self.assertEqual(1, ifr.infer('x/b').public['V'].value)
+        write_tree(root, {'src/x/go.mod': 'module x\n\ngo 1.13\n\nrequire example.com/v v1.10.0\n'})
+        self.assertEqual(2, ifr.infer('x/b').public['V'].value)
+
+    def test_parallel_intern(self):
+        root = self.make_tree({
+            'src/a/a.go' : 'package a\ntype N int\ntype S = []int\nconst Y = 5\n',
+            'src/b/b.go' : 'package b\nimport "a"\ntype T = []int\ntype U = a.N\nconst V = a.Y + 47\n',
+            'src/m/m.go' : 'package m\nimport "a"\nimport "b"\ntype X = a.S\ntype Y = b.T\ntype W = []int\ntype P = a.N\ntype Q = b.U\nconst Z = b.V\n',
+        })
+        ifr = make_inferrer(root)
+        ifr.jobs = 2
+        try:
+            pkg = ifr.infer('m')
+        finally:
+            ifr.close()
+        self.assertEqual(52, pkg.public['Z'].value)
+        self.assertIs(pkg.public['W'].type, pkg.public['X'].type)
+        self.assertIs(pkg.public['W'].type, pkg.public['Y'].type)
+        self.assertIs(pkg.public['P'].type, pkg.public['Q'].type)
+
+    def test_cache_outdated(self):
+        root = self.make_tree({})
+        AstCache(os.path.join(root, 'asts')).save('a' * 64, [])
+        ExportCache(os.path.join(root, 'exps')).save('b' * 64, PackageScope('p', 'example.com/p'), [])
+        for path, _, names in os.walk(root):
+            for name in names:
+                with open(os.path.join(path, name), 'wb') as fp:
+                    fp.write(zlib.compress(b'cgoplus.ast\nNoSuchNode\n.'))
+        self.assertIsNone(AstCache(os.path.join(root, 'asts')).load('a' * 64))
+        self.assertIsNone(ExportCache(os.path.join(root, 'exps')).load('b' * 64, []))
+
+    def test_memory_ast_cache(self):
+        asts = MemoryAstCache(limit = 4400)
+        for i in range(8):
+            asts.save(str(i), os.urandom(1024))
+            asts.load('0')
+        self.assertLessEqual(asts.size, 4400)
+        self.assertEqual(['0', '5', '6', '7'], [key for key in map(str, range(8)) if asts.load(key) is not None])
+
+    def test_package_cache_stale(self):
+        root = self.make_tree({
+            'src/a/a.go' : 'package a\nconst Y = 5\n',
+            'src/e/e.go' : 'package e\nimport "a"\nconst M = a.Y * 100\n',
+            'src/m/m.go' : 'package m\nimport "e"\nconst Z = e.M\n',
+        })
+        ifr = make_inferrer(root)
+        pkg = ifr.infer('m')
+        self.assertEqual(500, pkg.public['Z'].value)
+        self.assertIs(import_of(pkg, 'e'), import_of(ifr.infer('m'), 'e'))
+        write_tree(root, {'src/a/a.go': 'package a\nconst Y = 5000\n'})
+        self.assertEqual(500000, ifr.infer('m').public['Z'].value)
+        self.assertIsNot(import_of(pkg, 'e'), import_of(ifr.infer('m'), 'e'))
+
+    def test_relation_scope(self):
+        ifr = Inferrer('linux', 'amd64', GOPROJ, GOROOT, GOPATH)
+        ft = FuncType()
+        it = InterfaceType()
+        it.add_method(Method('F', ft))
+        ta = NamedType('A', Types.Int, pkg = 'p')
+        tb = NamedType('B', Types.Int, pkg = 'p')
+        self.assertFalse(ifr._is_implements(ta, it))
+        self.assertFalse(ifr._is_implements(tb, it))
+        tb.add_method(Method('F', ft))
+        self.assertFalse(ifr._is_implements(ta, it))
+        self.assertTrue(ifr._is_implements(tb, it))
+        ta.add_method(Method('F', ft))
+        self.assertTrue(ifr._is_implements(ta, it))
+
+    def test_method_set_scope(self):
+        ft = FuncType()
+        st = StructType()
+        ta = NamedType('A', Types.Int, pkg = 'p')
+        tb = NamedType('B', Types.Int, pkg = 'p')
+        field = StructField()
+        field.name = 'A'
+        field.type = ta
+        field.embed = True
+        st.fields.append(field)
+        st.valid = True
+        tc = NamedType('C', st, pkg = 'p')
+        mset = tc.methods()
+        self.assertEqual({}, mset)
+        tb.add_method(Method('F', ft))
+        self.assertIs(mset, tc.methods())
+        ta.add_method(Method('F', ft))
+        self.assertEqual(['F'], list(tc.methods()))
+
+    def test_type_signature(self):
+        tab = TypeTable()
+        vt = SliceType()
+        self.assertEqual('[]?', vt.signature)
+        vt.elem = Types.Int
+        self.assertEqual('[]int', vt.signature)
+        self.assertEqual(SliceType(Types.Int).fingerprint, vt.fingerprint)
+        vt = tab.intern(vt)
+        self.assertEqual('[]int', vt.signature)
+        self.assertIs(vt, tab.intern(SliceType(Types.Int)))
+
+    def test_type_signature_incomplete(self):
+        st = StructType()
+        ft = FuncType()
+        self.assertEqual('struct {}', st.signature)
+        self.assertEqual('func()', ft.signature)
+        field = StructField()
+        field.name = 'x'
+        field.type = Types.Int
+        field.embed = False
+        st.fields.append(field)
+        st.valid = True
+        ft.args.append(Types.String)
+        self.assertEqual('struct {x int}', st.signature)
+        self.assertEqual('func(string)', ft.signature)
+        it = InterfaceType()
+        self.assertEqual('interface {}', it.signature)
+        it.add_method(Method('F', ft))
+        self.assertEqual('interface {F(string)}', it.signature)
+
+    def test_type_signature_named(self):
+        self.assertEqual(NamedType('T', pkg = 'a').signature, NamedType('T', pkg = 'a').signature)
+        self.assertNotEqual(NamedType('T').signature, NamedType('T').signature)
+        self.assertNotEqual(NamedType('T').fingerprint, NamedType('T').fingerprint)
+
+    def test_type_repr(self):
+        tab = TypeTable()
+        nt = NamedType('T', pkg = 'a')
+        self.assertEqual('a.T', nt.signature)
+        pt = tab.intern(SliceType(nt))
+        st = StructType()
+        field = StructField()
+        field.name = 'next'
+        field.type = pt
+        field.embed = False
+        st.fields.append(field)
+        st.valid = True
+        nt.type = st
+        self.assertEqual('[]T(struct)', repr(pt))
+        nt.type = tab.intern(st)
+        self.assertEqual('[]T(struct)', repr(pt))
+
+    def test_target_sharing(self):
+        root = self.make_tree({
+            'src/a/a.go'        : 'package a\nconst Y = 5\n',
+            'src/p/p_linux.go'  : 'package p\nconst N = 1\n',
+            'src/p/p_darwin.go' : 'package p\nconst N = 2\n',
+            'src/m/m.go'        : 'package m\nimport "a"\nimport "p"\nconst Z = a.Y * 10 + p.N\n',
+            'src/q/q.go'        : 'package q\nimport "a"\nconst Z = a.Y\n',
+        })
+        ifr = make_inferrer(root)
+        targets = [('linux', 'amd64', []), ('darwin', 'amd64', []), ('linux', 'arm64', [])]
+        pkgs = ifr.infer_targets('m', targets)
+        self.assertEqual([51, 52, 51], [pkg.public['Z'].value for pkg in pkgs])
+        self.assertIs(pkgs[0], pkgs[2])
+        self.assertIsNot(pkgs[0], pkgs[1])
+        pkgs = ifr.infer_targets('q', targets)
+        self.assertEqual([5, 5, 5], [pkg.public['Z'].value for pkg in pkgs])
+        self.assertIs(pkgs[0], pkgs[1])
+        self.assertIs(pkgs[0], pkgs[2])
+
+    def test_declaration_index(self):
+        root = self.make_tree({
+            'src/p/a.go' : 'package p\nconst A = B * C\nvar X, Y = 1, C\n',
+            'src/p/b.go' : 'package p\nconst B, C = 3, 4\n',
+        })
+        pkg = make_inferrer(root).infer('p')
+        self.assertEqual(12, pkg.public['A'].value)
+        self.assertEqual(4, pkg.public['C'].value)
+        self.assertIs(Types.Int, pkg.public['Y'].type)
+        write_tree(root, {'src/p/c.go': 'package p\nconst C = 5\n'})
+        self.assertRaisesRegex(SyntaxError, 'redeclared', make_inferrer(root).infer, 'p')
+
+    def test_method_set_cache(self):
+        ft = FuncType()
+        ta = NamedType('A', Types.Int)
+        ta.add_method(Method('F', ft))
+        ta.add_method(Method('G', ft), ptr = True)
+        pa = PtrType(ta)
+        mset = ta.methods()
+        pset = pa.methods()
+        self.assertEqual(['F'], list(mset))
+        self.assertEqual(['F', 'G'], list(pset))
+        self.assertIs(mset, ta.methods())
+        self.assertIs(pset, pa.methods())
+        ta.add_method(Method('E', ft))
+        self.assertEqual(['E', 'F'], list(ta.methods()))
+        self.assertEqual(['E', 'F', 'G'], list(pa.methods()))
+
+    def test_method_set_embed(self):
+        ft = FuncType()
+        st = StructType()
+        ta = NamedType('A', Types.Int)
+        tb = NamedType('B', Types.Int)
+        ta.add_method(Method('F', ft))
+        tb.add_method(Method('F', ft))
+        tb.add_method(Method('G', ft), ptr = True)
+        for name, vt in (('A', ta), ('B', PtrType(tb))):
+            field = StructField()
+            field.name = name
+            field.type = vt
+            field.embed = True
+            st.fields.append(field)
+        st.valid = True
+        tc = NamedType('C', st)
+        tc.add_method(Method('H', ft))
+        self.assertEqual(['G', 'H'], list(tc.methods()))
+        tc.add_method(Method('F', ft))
+        self.assertEqual(['F', 'G', 'H'], list(tc.methods()))
+
+    def test_type_intern(self):
+        tab = TypeTable()
+        vt = tab.intern(SliceType(Types.Int))
+        self.assertIs(vt, tab.intern(SliceType(Types.Int)))
+        self.assertIs(tab.intern(MapType(Types.String, vt)), tab.intern(MapType(Types.String, tab.intern(SliceType(Types.Int)))))
+        self.assertIsNot(tab.intern(PtrType(NamedType('T', Types.Int))), tab.intern(PtrType(NamedType('T', Types.Int))))
+        self.assertEqual(4, len(tab))
+        vt = SliceType()
+        self.assertIs(vt, tab.intern(vt))
+        self.assertEqual(4, len(tab))
+
+    def test_type_intern_arrays(self):
+        root = self.make_tree({
+            'src/p/p.go' : 'package p\nvar A = [...]int{1, 2, 3}\nvar B = [...]int{1, 2, 3, 4, 5}\nvar C = [3]int{}\n',
+        })
+        pkg = make_inferrer(root).infer('p')
+        self.assertEqual('[3]int', str(pkg.public['A'].type))
+        self.assertEqual('[5]int', str(pkg.public['B'].type))
+        self.assertIs(pkg.public['A'].type, pkg.public['C'].type)
+
+    def test_type_intern_packages(self):
+        root = self.make_tree({
+            'src/a/a.go' : 'package a\ntype S = map[string][]int\n',
+            'src/m/m.go' : 'package m\nimport "a"\ntype X = a.S\ntype Y = map[string][]int\n',
+        })
+        pkg = make_inferrer(root).infer('m')
+        self.assertIs(pkg.public['X'].type, pkg.public['Y'].type)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import pickle
 import unittest
 
 from goplus.parser import Parser
@@ -315,5 +316,53 @@ import (
 """
         print(Parser(Tokenizer(src, 'test.go')).parse())
 
+    def test_no_relex(self):
+        class _Tokenizer(Tokenizer):
+            def load_state(self, state):
+                raise AssertionError('tokens must not be read twice')
+        ret = Parser(_Tokenizer(_const_src, 'test.go')).parse()
+        self.assertEqual(' #include <stdio.h> #include <stdlib.h>', ret.imports[0].alias.src)
+        self.assertEqual('\n#include <stdint.h>\n', ret.imports[1].alias.src)
+
+    def test_memoize(self):
+        ps = Parser(Tokenizer('package test\nvar x = f([]map[string][]int{}, [4]struct{}{})\n', 'test.go'))
+        ps.parse()
+        self.assertGreater(ps.memo_hits, 0)
+        self.assertGreater(ps.memo_misses, 0)
+
+    def test_skip_bodies(self):
+        src = 'package test\nfunc f() int { return g(struct{}{}) }\nfunc g(v interface{}) int { x := }\nfunc h()\n'
+        pkg = Parser(Tokenizer(src, 'test.go'), skip_bodies = True).parse()
+        f, g, h = pkg.funcs
+        self.assertIsNotNone(f.lazy_)
+        self.assertIsNone(h.body)
+        self.assertEqual(len(f.body.body), 1)
+        self.assertIsNone(f.lazy_)
+        self.assertRaises(SyntaxError, lambda: g.body)
+
+    def test_skip_bodies_refs(self):
+        src = 'package test\nvar x = []map[string]int{}\nfunc f() int { return g(1) }\n'
+        ps = Parser(Tokenizer(src, 'test.go'), skip_bodies = True)
+        fn = ps.parse().funcs[0]
+        body = fn.lazy_.args[0]
+        self.assertEqual({}, ps.memo)
+        self.assertEqual(['{', 'return', 'g', '(', 1, ')', '}'], [body[i].value for i in range(len(body))])
+        self.assertEqual(len(fn.body.body), 1)
+
+    def test_pickle(self):
+        src = 'package test\nfunc f() int { return g(struct{}{}) + 1 }\n'
+        pkg = Parser(Tokenizer(src, 'test.go'), skip_bodies = True).parse()
+        ret = pickle.loads(pickle.dumps(pkg, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(ret.funcs[0].name.value, 'f')
+        self.assertIsNotNone(ret.funcs[0].lazy_)
+        self.assertEqual(repr(ret.funcs[0].body), repr(pkg.funcs[0].body))
+
+    def test_parse_header(self):
+        src = 'package test\nimport "fmt"\nimport (\n    m "math"\n)\nfunc f( {\n'
+        pkg = Parser(Tokenizer(src, 'test.go')).parse_header()
+        self.assertEqual(pkg.name.value, 'test')
+        self.assertEqual([imp.path.value for imp in pkg.imports], [b'fmt', b'math'])
+        self.assertEqual(pkg.funcs, [])
+
 if __name__ == '__main__':
     unittest.main()
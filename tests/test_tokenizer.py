@@ -5,6 +5,9 @@ import unittest
 
 from goplus.tokenizer import Token
 from goplus.tokenizer import Tokenizer
+from goplus.tokenizer import BytesTokenizer
+from goplus.tokenizer import TokenArray
+from goplus.tokenizer import TokenBuffer
 from goplus.tokenizer import TokenType
 from goplus.tokenizer import TokenValue
 
@@ -346,5 +349,151 @@ import (
             (TokenType.LF       , None                                                              , 10,  1, 11,  0),
         ])
 
+    def test_line_directives(self):
+        src = """package foo
+//line bar.go:10
+var x = 1
+/*line baz.go:20:5*/ y := 2
+//line :30:3
+  w
+/*line 7*/q
+"""
+        seq = [
+            (TokenType.Keyword  , 'package' ,  0,  0, 'foo.go'),
+            (TokenType.Name     , 'foo'     ,  0,  8, 'foo.go'),
+            (TokenType.LF       , None      ,  0, 11, 'foo.go'),
+            (TokenType.Keyword  , 'var'     ,  9,  0, 'bar.go'),
+            (TokenType.Name     , 'x'       ,  9,  4, 'bar.go'),
+            (TokenType.Operator , '='       ,  9,  6, 'bar.go'),
+            (TokenType.Int      , 1         ,  9,  8, 'bar.go'),
+            (TokenType.LF       , None      ,  9,  9, 'bar.go'),
+            (TokenType.Name     , 'y'       , 19,  5, 'baz.go'),
+            (TokenType.Operator , ':='      , 19,  7, 'baz.go'),
+            (TokenType.Int      , 2         , 19, 10, 'baz.go'),
+            (TokenType.LF       , None      , 19, 11, 'baz.go'),
+            (TokenType.Name     , 'w'       , 29,  4, 'baz.go'),
+            (TokenType.LF       , None      , 29,  5, 'baz.go'),
+            (TokenType.Name     , 'q'       ,  6, 10, 'baz.go'),
+            (TokenType.LF       , None      ,  6, 11, 'baz.go'),
+        ]
+        for lazy in (False, True):
+            tk = Tokenizer(src, 'foo.go', lazy)
+            tokens = []
+            while not tk.is_eof:
+                tokens.append(tk.next())
+            self.assertEqual(seq, [(x.kind, x.value, x.row, x.col, x.file) for x in tokens])
+
+    def test_lazy_positions(self):
+        tk = Tokenizer('a\n  b "c', '<test>', lazy = True)
+        a, lf, b = tk.next(), tk.next(), tk.next()
+        self.assertEqual((0, 0), (a.row, a.col))
+        self.assertEqual((0, 1), (lf.row, lf.col))
+        self.assertEqual((1, 2), (b.row, b.col))
+        self.assertRaisesRegex(SyntaxError, '<test>:2:5: unexpected EOF', tk.next)
+
+    def test_token_buffer(self):
+        src = """package foo
+//go:nosplit
+func bar() string { return "a\\tb" + `c` + string('d') }
+var x = []float64{1, 2.5, 3i}
+"""
+        tk = Tokenizer(src, '<test>')
+        buf = TokenBuffer(src, '<test>')
+        cur = buf.cursor()
+        while not tk.is_eof:
+            x, y = tk.next(), cur.next()
+            self.assertEqual(x.kind, y.kind)
+            self.assertEqual(repr(x.value), repr(y.value))
+            self.assertEqual((x.row, x.col, x.file), (y.row, y.col, y.file))
+        self.assertTrue(cur.is_eof)
+        self.assertEqual(TokenType.End, cur.next().kind)
+        self.assertEqual(len(buf), len(buf.kinds))
+
+    def test_token_buffer_cursor(self):
+        cur = TokenBuffer('a + b', '<test>').cursor()
+        self.assertEqual('a', cur.next().value)
+        st = cur.save_state()
+        self.assertEqual('+', cur.next().value)
+        self.assertEqual('b', cur.next().value)
+        cur.load_state(st)
+        self.assertEqual('+', cur.next().value)
+
+    def test_token_array(self):
+        src = 'a := b\n/*line x.go:10:1*/ c = "d" + 1.5\n' * 50
+        tk = Tokenizer(src, '<test>')
+        arr = TokenArray()
+        tokens = []
+        while not tk.is_eof:
+            tokens.append(tk.next())
+            arr.append(tokens[-1])
+        self.assertEqual(len(tokens), len(arr))
+        for idx in reversed(range(len(tokens))):
+            x, y = tokens[idx], arr[idx]
+            self.assertEqual((x.kind, x.value, x.row, x.col, x.file), (y.kind, y.value, y.row, y.col, y.file))
+        self.assertIs(arr[0], arr[0])
+        self.assertEqual([x.value for x in tokens[5:9]], [arr.slice(5, 9)[i].value for i in range(4)])
+
+    def test_bytes_mode(self):
+        src = r"""package 包
+/*line x.go:3:4*/ var é = "\x41\101\t中" + `raw
+λ` + "\u4e2d"
+//go:noescape
+x := 0x1f + .5e3i + '世'
+"""
+        tk = Tokenizer(src, '<test>')
+        btk = BytesTokenizer(src.encode('utf-8'), '<test>')
+        while not tk.is_eof:
+            x, y = tk.next(), btk.next()
+            self.assertEqual(x.kind, y.kind)
+            self.assertEqual(repr(x.value), repr(y.value))
+            self.assertEqual((x.row, x.col, x.file), (y.row, y.col, y.file))
+        self.assertTrue(btk.is_eof)
+
+    def test_bytes_mode_columns(self):
+        src = 'x := []byte{%s}\ny\u3000:= "é中" + z\u00a0/* λ */ + w\n' % ', '.join(map(str, range(256)))
+        tk = Tokenizer(src, '<test>')
+        btk = BytesTokenizer(src.encode('utf-8'), '<test>')
+        while not tk.is_eof:
+            x, y = tk.next(), btk.next()
+            self.assertEqual((x.kind, x.row, x.col), (y.kind, y.row, y.col))
+        self.assertTrue(btk.is_eof)
+        self.assertIsNone(btk.lines.cols[0])
+        self.assertIsNotNone(btk.lines.cols[1])
+
+    def test_bytes_mode_errors(self):
+        for src in ('"\\q"', '"abc', '"\\xZZ"', '`abc'):
+            self.assertRaises(SyntaxError, Tokenizer(src, '<test>').next)
+            self.assertRaises(SyntaxError, BytesTokenizer(src.encode('utf-8'), '<test>').next)
+
+    def test_no_comments(self):
+        src = """// line comment
+//go:nosplit
+/* block */ a /* multi
+line */ b // trailing
+# unix style
+//go:linkname x
+c
+"""
+        tk = Tokenizer(src, '<test>', comments = False)
+        tokens = []
+        while not tk.is_eof:
+            tokens.append(tk.next())
+        self.assertEqual([
+            (TokenType.LF        , None ,  0,  15),
+            (TokenType.Directive , None ,  1,   0),
+            (TokenType.LF        , None ,  1,  12),
+            (TokenType.Name      , 'a'  ,  2,  12),
+            (TokenType.LF        , None ,  2,  14),
+            (TokenType.Name      , 'b'  ,  3,   8),
+            (TokenType.LF        , None ,  3,  21),
+            (TokenType.LF        , None ,  4,  12),
+            (TokenType.LF        , None ,  5,  15),
+            (TokenType.Name      , 'c'  ,  6,   0),
+            (TokenType.LF        , None ,  6,   1),
+        ], [
+            (x.kind, None if x.kind == TokenType.Directive else x.value, x.row, x.col)
+            for x in tokens
+        ])
+
 if __name__ == '__main__':
     unittest.main()